@@ -1,25 +1,26 @@
 #api.py
-from fastapi import APIRouter, HTTPException, BackgroundTasks
+import config  # noqa: F401  (loads .env before the modules below read it)
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import StreamingResponse
+import asyncio
+import json
+from contextlib import aclosing
 import logging
 from pydantic import BaseModel
 import uuid
 import os
-from dotenv import load_dotenv
-from tools import generate_question, evaluate_answer_safe, _invoke_with_timeout
-
-# Load environment variables
-load_dotenv()
-
-# ====== Configure LangSmith Tracing ======
-if os.getenv("LANGSMITH_API_KEY"):
-    os.environ["LANGCHAIN_TRACING_V2"] = "true"
-    if not os.getenv("LANGCHAIN_PROJECT"):
-        os.environ["LANGCHAIN_PROJECT"] = "interview-agent"
-    if not os.getenv("LANGCHAIN_ENDPOINT"):
-        os.environ["LANGCHAIN_ENDPOINT"] = "https://api.smith.langchain.com"
+from tools import agenerate_question, aevaluate_answer_safe, eval_context, astream_invoke, _summary_prompt
+from session_store import create_session_store, SESSION_HISTORY_MAX
+import persistence
 
 router = APIRouter()
-INTERVIEW_SESSIONS: dict = {}
+# in-memory by default; set REDIS_URL to share sessions across uvicorn workers
+session_store = create_session_store()
+# seconds between keep-alive comments on an idle event stream
+SSE_KEEPALIVE_SECONDS = float(os.getenv("SSE_KEEPALIVE_SECONDS", "15"))
+# bounded job queue drained by a fixed pool of workers (started in main.py's lifespan)
+JOB_QUEUE_MAXSIZE = int(os.getenv("JOB_QUEUE_MAXSIZE", "1000"))
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "8"))
 
 # configure simple logger
 logger = logging.getLogger("interview_api")
@@ -46,19 +47,74 @@ class AnswerRequest(BaseModel):
     answer: str
 
 
+async def _log(session_id: str, line: str):
+    try:
+        await session_store.append_log(session_id, line)
+    except Exception:
+        pass
+
+
+def _queue_full_error() -> HTTPException:
+    return HTTPException(status_code=503, detail="Server is busy, please try again shortly.")
+
+
+def _job_queue(request: Request) -> asyncio.Queue:
+    """Return the app's job queue, or reject the request with 503 when it is full.
+
+    This is only an early check: the queue can still fill up while the handler awaits
+    the session store, so callers must also handle QueueFull from put_nowait().
+    """
+    queue = request.app.state.job_queue
+    if queue.full():
+        raise _queue_full_error()
+    return queue
+
+
+async def job_worker(queue: asyncio.Queue):
+    """Run queued background jobs one at a time until cancelled."""
+    while True:
+        job = await queue.get()
+        try:
+            if job["type"] == "first_question":
+                await _bg_generate_first_question(job["session_id"])
+            elif job["type"] == "evaluate_answer":
+                await _bg_evaluate_answer(job["session_id"], job["question"], job["answer"])
+            else:
+                logger.warning(f"Unknown job type: {job['type']}")
+        except Exception:
+            logger.exception(f"Job {job['type']} failed for session {job.get('session_id')}")
+        finally:
+            queue.task_done()
+
+
+def _status_payload(session_id: str, session: dict, log: list = None) -> dict:
+    payload = {
+        "session_id": session_id,
+        "status": session.get('status', 'pending'),
+        "question": session['questions'][-1] if session.get('questions') else None,
+        "error": session.get('error'),
+        "evaluation": session.get('evaluation', {}),
+    }
+    if log is not None:
+        payload["log"] = log
+    return payload
+
+
 @router.post("/start_interview", response_model=StartInterviewResponse)
-def start_interview(req: StartInterviewRequest, background_tasks: BackgroundTasks):
+async def start_interview(req: StartInterviewRequest, request: Request):
     job_description = req.job_description or ""
     if not job_description.strip():
         raise HTTPException(status_code=400, detail="Please provide a job description or topic for a mock interview.")
+    queue = _job_queue(request)
 
     session_id = str(uuid.uuid4())
-    INTERVIEW_SESSIONS[session_id] = {
+    await session_store.create(session_id, {
         "job_description": job_description,
         "parsed": None,
         "questions": [],
+        # question -> key points a strong answer covers, returned with each question
+        "key_points": {},
         "answers": [],
-        "log": [],
         "status": "pending",
         "error": None,
         "evaluation": {
@@ -67,106 +123,203 @@ def start_interview(req: StartInterviewRequest, background_tasks: BackgroundTask
             "next_question": None,
             "error": None
         }
-    }
+    })
 
-    # schedule background task to generate first question
-    background_tasks.add_task(_bg_generate_first_question, session_id)
+    # queue first-question generation for the worker pool
+    try:
+        queue.put_nowait({"type": "first_question", "session_id": session_id})
+    except asyncio.QueueFull:
+        # filled up while the session was being stored; don't leave it pending forever
+        await session_store.delete(session_id)
+        raise _queue_full_error()
 
     return {"session_id": session_id, "question": ""}
 
 
-def _bg_generate_first_question(session_id: str):
-    session = INTERVIEW_SESSIONS.get(session_id)
+async def _bg_generate_first_question(session_id: str):
+    session = await session_store.get(session_id)
     if not session:
         return
+    _apply = None
     try:
-        session['log'].append('bg_generate_first_question: start')
+        await _log(session_id, 'bg_generate_first_question: start')
         job_description = session.get("job_description", "")
-        # use _invoke_with_timeout internally from tools.py
-        qobj = generate_question(job_description)
+        # awaited on the event loop via AsyncOpenAI (see tools.py)
+        qobj = await agenerate_question(job_description, use_cache=True)
         question = qobj.get('question') if isinstance(qobj, dict) else str(qobj)
         parsed = qobj.get('parsed') if isinstance(qobj, dict) else None
 
-        session['parsed'] = parsed
-        session['questions'].append(question)
-        session['status'] = 'ready'
-        session['evaluation']['status'] = 'idle'
-        session['log'].append(f'bg_generate_first_question: question ready ({len(question or "")} chars)')
+        def _apply(session):
+            session['parsed'] = parsed
+            session['questions'].append(question)
+            session['key_points'] = {question: qobj.get('key_points') or []}
+            del session['questions'][:-SESSION_HISTORY_MAX]
+            session['status'] = 'ready'
+            session['evaluation']['status'] = 'idle'
+        await _log(session_id, f'bg_generate_first_question: question ready ({len(question or "")} chars)')
     except Exception as e:
-        session['status'] = 'error'
-        session['error'] = str(e)
-        try:
-            session['log'].append(f'bg_generate_first_question: exception: {e}')
-        except Exception:
-            pass
+        error = str(e)
+
+        def _apply(session):
+            session['status'] = 'error'
+            session['error'] = error
+        await _log(session_id, f'bg_generate_first_question: exception: {e}')
+    finally:
+        # applied to the latest stored copy, not the snapshot read above
+        if _apply is not None:
+            await session_store.update(session_id, _apply)
+        await session_store.notify(session_id)
 
 
 @router.post("/answer_question/")
-def answer_question(req: AnswerRequest, background_tasks: BackgroundTasks):
+async def answer_question(req: AnswerRequest, request: Request):
     logger.info(f"Received answer_question request: session_id={req.session_id} question_len={len(req.question or '')}")
-    session = INTERVIEW_SESSIONS.get(req.session_id)
+    session = await session_store.get(req.session_id)
     if not session:
         raise HTTPException(status_code=404, detail="Session not found")
+    queue = _job_queue(request)
+
+    previous_evaluation = {}
 
-    session['evaluation']['status'] = 'pending'
-    session['evaluation']['error'] = None
-    background_tasks.add_task(_bg_evaluate_answer, req.session_id, req.question, req.answer)
+    def _mark_pending(session):
+        previous_evaluation.update(session['evaluation'])
+        session['evaluation']['status'] = 'pending'
+        session['evaluation']['error'] = None
+    await session_store.update(req.session_id, _mark_pending)
+    await session_store.notify(req.session_id)
+    try:
+        queue.put_nowait({
+            "type": "evaluate_answer",
+            "session_id": req.session_id,
+            "question": req.question,
+            "answer": req.answer
+        })
+    except asyncio.QueueFull:
+        # filled up while the session was being saved; put the evaluation state back
+        await session_store.update(req.session_id, lambda session: session.update(evaluation=previous_evaluation))
+        await session_store.notify(req.session_id)
+        raise _queue_full_error()
 
     return {"message": "evaluation_scheduled", "session_id": req.session_id}
 
 
-def _bg_evaluate_answer(session_id: str, question: str, answer: str):
-    session = INTERVIEW_SESSIONS.get(session_id)
+async def _bg_evaluate_answer(session_id: str, question: str, answer: str):
+    session = await session_store.get(session_id)
     if not session:
         return
-    try:
-        session['log'].append('bg_evaluate_answer: start')
-        feedback = evaluate_answer_safe(question, answer)
-        session['log'].append('bg_evaluate_answer: evaluator returned')
-        raw_fb = feedback.get('raw_feedback') if isinstance(feedback, dict) else None
-        if raw_fb:
-            session['log'].append(f'raw_feedback_snippet: {str(raw_fb)[:400]}')
-    except Exception as e:
-        session['evaluation']['status'] = 'error'
-        session['evaluation']['error'] = str(e)
-        try:
-            session['log'].append(f'bg_evaluate_answer: exception: {e}')
-        except Exception:
-            pass
+    await _log(session_id, 'bg_evaluate_answer: start')
+    key_points = session.get('key_points') or {}
+    # grade against the key points generated with the question, when we generated it
+    context = eval_context(session.get('job_description') or "", question, key_points[question]) if question in key_points else None
+    # evaluation and next-question generation are independent, so run them concurrently
+    feedback, next_qobj = await asyncio.gather(
+        # resubmitting the same answer (e.g. a Streamlit rerun) reuses the cached evaluation
+        aevaluate_answer_safe(question, answer, context=context),
+        agenerate_question(session.get('job_description') or "", previous_questions=list(session['questions'])),
+        return_exceptions=True
+    )
+    # `session` is a snapshot from before the LLM calls; changes below go through
+    # session_store.update so another job's writes in the meantime are not lost
+
+    if isinstance(feedback, BaseException):
+        def _fail(session):
+            session['evaluation']['status'] = 'error'
+            session['evaluation']['error'] = str(feedback)
+        await _log(session_id, f'bg_evaluate_answer: exception: {feedback}')
+        await session_store.update(session_id, _fail)
+        await session_store.notify(session_id)
         return
 
-    session["answers"].append({
+    await _log(session_id, 'bg_evaluate_answer: evaluator returned')
+    raw_fb = feedback.get('raw_feedback') if isinstance(feedback, dict) else None
+    if raw_fb:
+        await _log(session_id, f'raw_feedback_snippet: {str(raw_fb)[:400]}')
+
+    record = {
         "question": question,
         "answer": answer,
         "feedback": feedback
-    })
+    }
+    # fire-and-forget: the writer task batches records to the database off this path
+    persistence.enqueue(session_id, record)
 
-    try:
-        next_qobj = generate_question(session.get('job_description') or "")
-        next_question = next_qobj.get('question') if isinstance(next_qobj, dict) else str(next_qobj)
-    except Exception:
+    next_key_points = None
+    if isinstance(next_qobj, BaseException):
+        await _log(session_id, f'bg_evaluate_answer: next question failed: {next_qobj}')
         next_question = None
+    else:
+        next_question = next_qobj.get('question') if isinstance(next_qobj, dict) else str(next_qobj)
+        if isinstance(next_qobj, dict):
+            next_key_points = next_qobj.get('key_points') or []
 
-    session["questions"].append(next_question)
-    session['evaluation']['status'] = 'ready'
-    session['evaluation']['last_feedback'] = feedback
-    session['evaluation']['next_question'] = next_question
-    try:
-        session['log'].append('bg_evaluate_answer: finished, evaluation ready')
-    except Exception:
-        pass
+    def _apply(session):
+        session["answers"].append(record)
+        del session["answers"][:-SESSION_HISTORY_MAX]
+        key_points = session.get('key_points') or {}
+        if next_key_points is not None:
+            key_points[next_question] = next_key_points
+        session["questions"].append(next_question)
+        del session["questions"][:-SESSION_HISTORY_MAX]
+        session['key_points'] = {q: key_points[q] for q in session["questions"] if q in key_points}
+        session['evaluation']['status'] = 'ready'
+        session['evaluation']['last_feedback'] = feedback
+        session['evaluation']['next_question'] = next_question
+    await _log(session_id, 'bg_evaluate_answer: finished, evaluation ready')
+    await session_store.update(session_id, _apply)
+    await session_store.notify(session_id)
 
 
 @router.get("/status/{session_id}")
-def status(session_id: str):
-    session = INTERVIEW_SESSIONS.get(session_id)
+async def status(session_id: str):
+    session = await session_store.get(session_id)
     if not session:
         raise HTTPException(status_code=404, detail="Session not found")
-    return {
-        "session_id": session_id,
-        "status": session.get('status', 'pending'),
-        "question": session['questions'][-1] if session.get('questions') else None,
-        "error": session.get('error'),
-        "evaluation": session.get('evaluation', {}),
-        "log": session.get('log', [])
-    }
+    return _status_payload(session_id, session, log=await session_store.get_log(session_id))
+
+
+@router.get("/events/{session_id}")
+async def events(session_id: str, request: Request):
+    """Server-Sent Events stream of the session status, pushed whenever it changes."""
+    if not await session_store.get(session_id):
+        raise HTTPException(status_code=404, detail="Session not found")
+
+    async def _stream():
+        # subscribe before reading state so a change in between is not missed
+        async with session_store.subscribe(session_id) as subscription:
+            last = None
+            while not await request.is_disconnected():
+                session = await session_store.get(session_id)
+                if not session:
+                    break
+                data = json.dumps(_status_payload(session_id, session), default=str)
+                if data != last:
+                    last = data
+                    yield f"data: {data}\n\n"
+                if not await subscription.wait(SSE_KEEPALIVE_SECONDS):
+                    yield ": keep-alive\n\n"
+
+    return StreamingResponse(_stream(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+
+@router.get("/summary/{session_id}")
+async def summary(session_id: str):
+    """Stream an overall evaluation of the session's answers as plain text while it is generated."""
+    session = await session_store.get(session_id)
+    if not session:
+        raise HTTPException(status_code=404, detail="Session not found")
+    if not session.get('answers'):
+        raise HTTPException(status_code=400, detail="Answer at least one question before requesting a summary.")
+
+    prompt = _summary_prompt(session['answers'])
+
+    async def _stream():
+        try:
+            # aclosing: a client disconnect closes the upstream LLM stream right away
+            async with aclosing(astream_invoke(prompt)) as pieces:
+                async for piece in pieces:
+                    yield piece
+        except Exception as e:
+            logger.warning(f"summary stream failed for session {session_id}: {e}")
+            yield "\n\nSummary unavailable due to LLM error."
+
+    return StreamingResponse(_stream(), media_type="text/plain; charset=utf-8")
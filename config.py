@@ -0,0 +1,29 @@
+#config.py
+# Loads .env and configures LangSmith tracing. Import this before anything that reads
+# environment variables; the _INITIALIZED sentinel keeps a reload from redoing the work.
+import os
+from dotenv import load_dotenv
+
+if not globals().get("_INITIALIZED"):
+    # ====== Load Environment Variables ======
+    # Skip the .env lookup when the environment already provides the key (containers,
+    # serverless); such deployments are expected to inject the rest of the settings too.
+    if os.getenv("OPENAI_API_KEY") is None:
+        load_dotenv()
+    _INITIALIZED = True
+
+# ====== Configure LangSmith Tracing ======
+# Set these environment variables in your .env file:
+# LANGSMITH_API_KEY=your_api_key_here
+# LANGCHAIN_TRACING_V2=true
+# LANGCHAIN_PROJECT=interview-agent (or your project name)
+# LANGCHAIN_ENDPOINT=https://api.smith.langchain.com
+
+LANGSMITH_ENABLED = bool(os.getenv("LANGSMITH_API_KEY"))
+
+if LANGSMITH_ENABLED:
+    os.environ["LANGCHAIN_TRACING_V2"] = "true"
+    if not os.getenv("LANGCHAIN_PROJECT"):
+        os.environ["LANGCHAIN_PROJECT"] = "interview-agent"
+    if not os.getenv("LANGCHAIN_ENDPOINT"):
+        os.environ["LANGCHAIN_ENDPOINT"] = "https://api.smith.langchain.com"
@@ -1,138 +1,127 @@
 #interview_agent.py
-from langchain.agents import create_react_agent, Tool
-from tools import generate_question, evaluate_answer_safe, check_relevant_input, _invoke_with_timeout
-from langchain_core.prompts import PromptTemplate
-from openai import OpenAI
-from dotenv import load_dotenv
-from langchain_openai import ChatOpenAI
+import config  # noqa: F401  (loads .env and LangSmith settings)
+from tools import (
+    agenerate_question, agenerate_and_prepare, eval_context, aevaluate_answers_batch, _ainvoke_with_timeout,
+    _response_cache_key, _cache_get, _cache_put, _summary_prompt, client
+)
 import os
+import asyncio
+import threading
 
-# ====== Load Environment Variables ======
-load_dotenv()
-
-# ====== Configure LangSmith Tracing ======
-# Set these environment variables in your .env file:
-# LANGSMITH_API_KEY=your_api_key_here
-# LANGCHAIN_TRACING_V2=true
-# LANGCHAIN_PROJECT=interview-agent (or your project name)
-# LANGCHAIN_ENDPOINT=https://api.smith.langchain.com
-
-# Enable tracing if API key is set
-if os.getenv("LANGSMITH_API_KEY"):
-    os.environ["LANGCHAIN_TRACING_V2"] = "true"
-    if not os.getenv("LANGCHAIN_PROJECT"):
-        os.environ["LANGCHAIN_PROJECT"] = "interview-agent"
-    if not os.getenv("LANGCHAIN_ENDPOINT"):
-        os.environ["LANGCHAIN_ENDPOINT"] = "https://api.smith.langchain.com"
-
-# ====== Initialize LangChain ChatOpenAI (will be traced automatically) ======
-llm = ChatOpenAI(model="gpt-4o-mini", temperature=0.7)
-
-# ====== Initialize OpenAI Client (GPT-4o-mini) ======
-# Note: Direct OpenAI client calls won't be traced unless wrapped with LangSmith
-client = OpenAI()
-
-def llm_invoke(prompt: str):
-    """Helper for invoking GPT-4o-mini."""
-    response = client.chat.completions.create(
-        model="gpt-4o-mini",
-        messages=[{"role": "user", "content": prompt}],
-        temperature=0.7
-    )
-    return response.choices[0].message.content.strip()
-
-# ====== DEFINE TOOLS FOR AGENT ======
-tools = [
-    Tool(
-        name="Question Generator",
-        func=lambda job_description: generate_question(job_description),
-        description="Generates the next relevant interview question based on the job description or topic."
-    ),
-    Tool(
-        name="Answer Evaluator",
-        func=lambda input: evaluate_answer_safe(input['question'], input['answer']),
-        description="Evaluates the candidate's answer, providing feedback and a score."
-    ),
-    Tool(
-        name="Input Relevance Checker",
-        func=lambda user_input: check_relevant_input(user_input),
-        description="Checks if the user's input is relevant for a mock interview."
-    )
-]
-
-# ====== ReAct-Style Prompt ======
-react_template = '''Answer the following questions as best you can. You have access to the following tools:
-
-{tools}
+# ====== OpenAI Client (GPT-4o-mini) ======
+# Reuses tools.client: pooled, with timeouts/retries, and traced when LangSmith is enabled
 
-Use the following format:
+def llm_invoke(prompt: str, temperature: float = 0.7, cache: bool = False):
+    """Helper for invoking GPT-4o-mini.
 
-Question: the input question you must answer
-Thought: you should always think about what to do
-Action: the action to take, should be one of [{tool_names}]
-Action Input: the input to the action
-Observation: the result of the action
-... (this Thought/Action/Action Input/Observation can repeat N times)
-Thought: I now know the final answer
-Final Answer: the final answer to the original input question
+    Responses are cached by exact prompt when temperature is 0, or when cache=True.
+    """
+    messages = [{"role": "user", "content": prompt}]
+    key = _response_cache_key(messages, temperature, cache)
+    if key:
+        hit = _cache_get(key)
+        if hit is not None:
+            return hit
 
-Begin!
+    response = client.chat.completions.create(
+        model="gpt-4o-mini",
+        messages=messages,
+        temperature=temperature
+    )
+    content = response.choices[0].message.content.strip()
+    if key:
+        _cache_put(key, content)
+    return content
 
-Question: {input}
-Thought:{agent_scratchpad}'''
+# ====== MOCK INTERVIEW FUNCTION ======
+# Upper bound on evaluations in flight at once, to stay inside OpenAI rate limits
+MOCK_INTERVIEW_MAX_CONCURRENT = int(os.getenv("MOCK_INTERVIEW_MAX_CONCURRENT", "5"))
+# Answers evaluated per LLM call when batching; 1 disables batching
+MOCK_INTERVIEW_EVAL_BATCH = int(os.getenv("MOCK_INTERVIEW_EVAL_BATCH", "8"))
 
-prompt = PromptTemplate.from_template(react_template)
 
-# ====== Create the Agent ======
-# (We can pass None as llm if your app never calls it directly)
-agent = create_react_agent(
-    llm=llm,
-    tools=tools,
-    prompt=prompt,
-)
-
-# ====== MOCK INTERVIEW FUNCTION ======
-def run_mock_interview(job_description: str, user_answers: list[str]):
+async def run_mock_interview(job_description: str, user_answers: list[str], max_concurrent: int = None,
+                             batch_size: int = None):
     """
     Run a mock interview based on a job description or topic.
 
     Args:
         job_description (str): The job description or topic for the mock interview.
         user_answers (list[str]): List of candidate answers in order.
+        max_concurrent (int): Maximum number of answer evaluations run concurrently.
+        batch_size (int): Answers evaluated together in one LLM call (defaults to MOCK_INTERVIEW_EVAL_BATCH).
 
     Returns:
-        dict: Feedback for each question-answer and a final summary.
+        dict: Feedback for each question-answer, the next question and a final summary.
     """
-    feedback_list = []
-    qobj = generate_question(job_description)
-    question = qobj.get('question') if isinstance(qobj, dict) else str(qobj)
-
-    for answer in user_answers:
-        feedback = evaluate_answer_safe(question, answer)
-        feedback_list.append({
-            "question": question,
-            "answer": answer,
-            "feedback": feedback
-        })
-
-    # Generate next question
-    qobj = generate_question(job_description)
-    question = qobj.get('question') if isinstance(qobj, dict) else str(qobj)
+    # the question call also returns what a strong answer covers, so evaluation needs no extra context call
+    qobj, evaluate_with_ctx = await agenerate_and_prepare(job_description, use_cache=True)
+    question = qobj.get('question')
+    context = eval_context(job_description, question, qobj.get('key_points'))
+
+    # Evaluate answers in batches of batch_size per call, batches run concurrently under a semaphore
+    sem = asyncio.Semaphore(max_concurrent or MOCK_INTERVIEW_MAX_CONCURRENT)
+    batch_size = max(1, batch_size or MOCK_INTERVIEW_EVAL_BATCH)
+    chunks = [user_answers[i:i + batch_size] for i in range(0, len(user_answers), batch_size)]
+
+    async def _evaluate(answers: list):
+        async with sem:
+            if len(answers) == 1:
+                return [await evaluate_with_ctx(answers[0])]
+            return await aevaluate_answers_batch([(question, answer) for answer in answers], context=context)
+
+    feedbacks = [fb for chunk in await asyncio.gather(*[_evaluate(c) for c in chunks]) for fb in chunk]
+    feedback_list = [
+        {"question": question, "answer": answer, "feedback": feedback}
+        for answer, feedback in zip(user_answers, feedbacks)
+    ]
 
     # Generate overall summary
-    history_text = "\n".join(
-        f"Q: {item['question']}\nA: {item['answer']}\nFeedback: {item['feedback']}"
-        for item in feedback_list
-    )
-    summary_prompt = f"Based on this interview:\n{history_text}\nProvide an overall evaluation, highlighting strengths and areas of improvement."
+    summary_prompt = _summary_prompt(feedback_list)
 
-    try:
-        resp = _invoke_with_timeout(summary_prompt)
-        final_summary = (getattr(resp, 'content', resp) or '').strip()
-    except Exception:
+    async def _summarize():
         try:
-            final_summary = llm_invoke(summary_prompt)
+            resp = await _ainvoke_with_timeout(summary_prompt)
+            return (getattr(resp, 'content', resp) or '').strip()
         except Exception:
-            final_summary = "Summary unavailable due to LLM error."
+            try:
+                return await asyncio.to_thread(llm_invoke, summary_prompt)
+            except Exception:
+                return "Summary unavailable due to LLM error."
+
+    # Summary and next question are independent, so fetch them together
+    final_summary, next_qobj = await asyncio.gather(
+        _summarize(),
+        agenerate_question(job_description, previous_questions=[question]),
+        return_exceptions=True
+    )
+    if isinstance(next_qobj, BaseException):
+        next_question = None
+    else:
+        next_question = next_qobj.get('question') if isinstance(next_qobj, dict) else str(next_qobj)
+
+    return {"feedback_list": feedback_list, "next_question": next_question, "summary": final_summary}
+
 
-    return {"feedback_list": feedback_list, "summary": final_summary}
+# tools.aclient's connection pool (and _LLM_SEM) belong to the first event loop that uses
+# them, so every blocking call runs on one long-lived loop instead of a fresh asyncio.run()
+_sync_loop = None
+_sync_loop_lock = threading.Lock()
+
+
+def _get_sync_loop():
+    global _sync_loop
+    with _sync_loop_lock:
+        if _sync_loop is None:
+            _sync_loop = asyncio.new_event_loop()
+            threading.Thread(target=_sync_loop.run_forever, name="mock-interview-loop", daemon=True).start()
+        return _sync_loop
+
+
+def run_mock_interview_sync(job_description: str, user_answers: list[str], **kwargs):
+    """Blocking wrapper around run_mock_interview for scripts without an event loop.
+
+    Safe to call repeatedly; do not mix it with async callers of tools in the same process.
+    """
+    coro = run_mock_interview(job_description, user_answers, **kwargs)
+    return asyncio.run_coroutine_threadsafe(coro, _get_sync_loop()).result()
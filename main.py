@@ -1,30 +1,68 @@
 #main.py
+import config
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
+import asyncio
+import json
 import os
-from dotenv import load_dotenv
-from api import router
-
-# Load environment variables
-load_dotenv()
-
-# ====== Configure LangSmith Tracing ======
-# Set these environment variables in your .env file:
-# LANGSMITH_API_KEY=your_api_key_here
-# LANGCHAIN_TRACING_V2=true
-# LANGCHAIN_PROJECT=interview-agent (or your project name)
-# LANGCHAIN_ENDPOINT=https://api.smith.langchain.com
-
-if os.getenv("LANGSMITH_API_KEY"):
-    os.environ["LANGCHAIN_TRACING_V2"] = "true"
-    if not os.getenv("LANGCHAIN_PROJECT"):
-        os.environ["LANGCHAIN_PROJECT"] = "interview-agent"
-    if not os.getenv("LANGCHAIN_ENDPOINT"):
-        os.environ["LANGCHAIN_ENDPOINT"] = "https://api.smith.langchain.com"
+import threading
+from api import router, job_worker, JOB_QUEUE_MAXSIZE, JOB_WORKERS
+from tools import aclose_clients, awarm_question_cache, load_encoding
+import persistence
+
+if config.LANGSMITH_ENABLED:
     print("✅ LangSmith tracing is ENABLED")
 else:
     print("⚠️  LangSmith tracing is DISABLED - Set LANGSMITH_API_KEY in .env to enable")
 
-app = FastAPI(title="AI Mock Interview Agent (OpenAI GPT-4o-mini)")
+
+# Seconds to let queued jobs finish on shutdown before the workers are cancelled
+JOB_DRAIN_TIMEOUT = float(os.getenv("JOB_DRAIN_TIMEOUT", "30"))
+# JSON list of common job descriptions whose opening questions are cached at startup
+SEED_JDS_PATH = os.getenv("SEED_JDS_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "seed_jds.json"))
+
+
+async def _warm_question_cache():
+    try:
+        with open(SEED_JDS_PATH, encoding="utf-8") as f:
+            seeds = json.load(f)
+        added = await awarm_question_cache(seeds)
+        print(f"✅ Question cache warmed with {added} new seed job descriptions")
+    except Exception as e:
+        print(f"⚠️  Could not warm question cache from {SEED_JDS_PATH}: {e}")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # tiktoken may have to download its vocabulary; a daemon thread keeps a stalled
+    # download from blocking startup or shutdown
+    threading.Thread(target=load_encoding, name="tiktoken-load", daemon=True).start()
+    # warm in the background so startup is not blocked on LLM calls
+    warm_task = asyncio.create_task(_warm_question_cache()) if os.path.exists(SEED_JDS_PATH) else None
+
+    # fixed worker pool for background LLM jobs, fed by the API endpoints
+    app.state.job_queue = asyncio.Queue(maxsize=JOB_QUEUE_MAXSIZE)
+    workers = [asyncio.create_task(job_worker(app.state.job_queue)) for _ in range(JOB_WORKERS)]
+    # batched answer-history writer (only when INTERVIEW_DB_PATH is set)
+    await persistence.start()
+    yield
+
+    if warm_task and not warm_task.done():
+        warm_task.cancel()
+    # graceful shutdown: drain queued jobs (bounded), then stop the workers
+    try:
+        await asyncio.wait_for(app.state.job_queue.join(), timeout=JOB_DRAIN_TIMEOUT)
+    except asyncio.TimeoutError:
+        print(f"⚠️  {app.state.job_queue.qsize()} queued jobs dropped on shutdown")
+    for worker in workers:
+        worker.cancel()
+    await asyncio.gather(*workers, return_exceptions=True)
+    await persistence.stop()
+    # release pooled OpenAI connections on shutdown
+    await aclose_clients()
+
+
+app = FastAPI(title="AI Mock Interview Agent (OpenAI GPT-4o-mini)", lifespan=lifespan)
 
 # include your API router
 app.include_router(router)
@@ -0,0 +1,93 @@
+#persistence.py
+import os
+import json
+import time
+import asyncio
+import sqlite3
+
+# SQLite file for the answered-question history; leave unset to disable persistence
+INTERVIEW_DB_PATH = os.getenv("INTERVIEW_DB_PATH")
+# Records are written in batches of up to this many rows...
+PERSIST_BATCH_SIZE = int(os.getenv("PERSIST_BATCH_SIZE", "50"))
+# ...or whatever has arrived this many seconds after the first record of a batch
+PERSIST_FLUSH_INTERVAL = float(os.getenv("PERSIST_FLUSH_INTERVAL", "0.1"))
+PERSIST_QUEUE_MAXSIZE = int(os.getenv("PERSIST_QUEUE_MAXSIZE", "10000"))
+
+_queue = None
+_worker = None
+
+
+def _write_batch(records: list):
+    conn = sqlite3.connect(INTERVIEW_DB_PATH)
+    try:
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS answers ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, created_at REAL NOT NULL, session_id TEXT NOT NULL, "
+            "question TEXT, answer TEXT, rating INTEGER, feedback TEXT)"
+        )
+        conn.executemany(
+            "INSERT INTO answers (created_at, session_id, question, answer, rating, feedback) VALUES (?, ?, ?, ?, ?, ?)",
+            [
+                (r["created_at"], r["session_id"], r.get("question"), r.get("answer"),
+                 (r.get("feedback") or {}).get("rating"), json.dumps(r.get("feedback"), default=str))
+                for r in records
+            ]
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+
+async def _persist_worker(queue: asyncio.Queue):
+    loop = asyncio.get_running_loop()
+    while True:
+        batch = [await queue.get()]
+        deadline = loop.time() + PERSIST_FLUSH_INTERVAL
+        while len(batch) < PERSIST_BATCH_SIZE:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(queue.get(), timeout=remaining))
+            except asyncio.TimeoutError:
+                break
+        try:
+            await asyncio.to_thread(_write_batch, batch)
+        except Exception as e:
+            print(f"⚠️ Could not persist {len(batch)} answer records: {e}")
+        finally:
+            for _ in batch:
+                queue.task_done()
+
+
+def enqueue(session_id: str, record: dict):
+    """Queue an answered-question record for persistence without waiting on I/O."""
+    if _queue is None:
+        return
+    try:
+        _queue.put_nowait({"created_at": time.time(), "session_id": session_id, **record})
+    except asyncio.QueueFull:
+        print("⚠️ Persistence queue full, dropping answer record")
+
+
+async def start():
+    """Start the background writer if INTERVIEW_DB_PATH is configured."""
+    global _queue, _worker
+    if not INTERVIEW_DB_PATH:
+        return
+    _queue = asyncio.Queue(maxsize=PERSIST_QUEUE_MAXSIZE)
+    _worker = asyncio.create_task(_persist_worker(_queue))
+
+
+async def stop(timeout: float = 10):
+    """Flush queued records (bounded by timeout) and stop the writer."""
+    global _queue, _worker
+    if _worker is None:
+        return
+    try:
+        await asyncio.wait_for(_queue.join(), timeout=timeout)
+    except asyncio.TimeoutError:
+        print(f"⚠️ {_queue.qsize()} answer records not persisted on shutdown")
+    _worker.cancel()
+    await asyncio.gather(_worker, return_exceptions=True)
+    _queue, _worker = None, None
@@ -0,0 +1,161 @@
+#semantic_cache.py
+import os
+import json
+import time
+import sqlite3
+import threading
+import numpy as np
+
+# Cosine similarity above which a cached question is reused
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.92"))
+# Seconds a cached entry stays valid (default: 7 days)
+SEMANTIC_CACHE_TTL = int(os.getenv("SEMANTIC_CACHE_TTL", str(7 * 24 * 3600)))
+# SQLite file used to persist entries across restarts; empty string keeps the cache in memory only
+SEMANTIC_CACHE_DB = os.getenv("SEMANTIC_CACHE_DB", "semantic_cache.db")
+# Maximum number of entries kept; expired and then the oldest entries are evicted beyond this
+SEMANTIC_CACHE_MAX_ENTRIES = int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "5000"))
+
+
+class SemanticCache:
+    """In-memory embedding matrix for nearest-neighbour lookups, persisted to SQLite.
+
+    Entries are tagged with the embedding model that produced them; rows from another
+    model (or with a different dimension) are ignored, so changing the model starts
+    from an empty cache instead of comparing incompatible vectors.
+    """
+
+    def __init__(self, db_path: str = SEMANTIC_CACHE_DB, threshold: float = SEMANTIC_CACHE_THRESHOLD,
+                 ttl: int = SEMANTIC_CACHE_TTL, model: str = "", max_entries: int = SEMANTIC_CACHE_MAX_ENTRIES):
+        self.db_path = db_path
+        self.threshold = threshold
+        self.ttl = ttl
+        self.model = model
+        self.max_entries = max(1, max_entries)
+        self._lock = threading.Lock()
+        self._matrix = None  # (capacity, dim) float32; the first _size rows are live and unit-normed
+        self._size = 0
+        self._entries = []   # list of (created_at, value) aligned with matrix rows
+        self._load()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path)
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS semantic_cache ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, created_at REAL NOT NULL, "
+            "embedding BLOB NOT NULL, value TEXT NOT NULL, model TEXT)"
+        )
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(semantic_cache)")}
+        if "model" not in columns:
+            # databases written before entries were tagged with their embedding model
+            conn.execute("ALTER TABLE semantic_cache ADD COLUMN model TEXT")
+        return conn
+
+    def _prune_db(self, conn):
+        conn.execute("DELETE FROM semantic_cache WHERE created_at < ?", (time.time() - self.ttl,))
+        conn.execute(
+            "DELETE FROM semantic_cache WHERE id NOT IN "
+            "(SELECT id FROM semantic_cache ORDER BY id DESC LIMIT ?)",
+            (self.max_entries,)
+        )
+        conn.commit()
+
+    def _load(self):
+        if not self.db_path:
+            return
+        try:
+            conn = self._connect()
+            try:
+                self._prune_db(conn)
+                rows = conn.execute(
+                    "SELECT created_at, embedding, value FROM semantic_cache WHERE model = ? ORDER BY id",
+                    (self.model,)
+                ).fetchall()
+            finally:
+                conn.close()
+        except Exception as e:
+            print(f"⚠️ Could not load semantic cache from {self.db_path}: {e}")
+            return
+
+        skipped = 0
+        for created_at, blob, value in rows:
+            try:
+                vec = np.frombuffer(blob, dtype=np.float32)
+                if self._matrix is not None and vec.shape[0] != self._matrix.shape[1]:
+                    skipped += 1
+                    continue
+                self._append(vec, (created_at, json.loads(value)))
+            except Exception:
+                skipped += 1
+        if skipped:
+            print(f"⚠️ Skipped {skipped} unreadable or mismatched semantic cache entries")
+
+    @staticmethod
+    def _normalize(vec) -> np.ndarray:
+        v = np.asarray(vec, dtype=np.float32)
+        norm = np.linalg.norm(v)
+        return v / norm if norm else v
+
+    def _append(self, v: np.ndarray, entry: tuple):
+        """Add a row, growing the matrix geometrically and evicting once max_entries is reached."""
+        if self._matrix is None:
+            self._matrix = np.empty((min(64, self.max_entries), v.shape[0]), dtype=np.float32)
+        if self._size >= self.max_entries:
+            self._evict()
+        if self._size == self._matrix.shape[0]:
+            grown = np.empty((min(self._matrix.shape[0] * 2, self.max_entries), v.shape[0]), dtype=np.float32)
+            grown[:self._size] = self._matrix[:self._size]
+            self._matrix = grown
+        self._matrix[self._size] = v
+        self._entries.append(entry)
+        self._size += 1
+
+    def _evict(self):
+        """Drop expired entries, then the oldest tenth, compacting the matrix in place."""
+        cutoff = time.time() - self.ttl
+        keep = [i for i, (created_at, _) in enumerate(self._entries) if created_at >= cutoff]
+        if len(keep) >= self.max_entries:
+            keep = keep[max(1, self.max_entries // 10):]
+        self._matrix[:len(keep)] = self._matrix[keep]
+        self._entries = [self._entries[i] for i in keep]
+        self._size = len(keep)
+
+    def lookup(self, vec):
+        """Return the cached value closest to vec if it clears the threshold and has not expired."""
+        v = self._normalize(vec)
+        with self._lock:
+            if not self._size or v.shape[0] != self._matrix.shape[1]:
+                return None
+            sims = self._matrix[:self._size] @ v
+            idx = int(np.argmax(sims))
+            created_at, value = self._entries[idx]
+            if sims[idx] < self.threshold or time.time() - created_at > self.ttl:
+                return None
+            return value
+
+    def add(self, vec, value: dict):
+        """Store value under vec in memory and, when configured, in SQLite."""
+        v = self._normalize(vec)
+        created_at = time.time()
+        with self._lock:
+            if self._matrix is not None and v.shape[0] != self._matrix.shape[1]:
+                print(f"⚠️ Not caching embedding of dimension {v.shape[0]} (cache holds {self._matrix.shape[1]})")
+                return
+            evicting = self._size >= self.max_entries
+            self._append(v, (created_at, value))
+
+        if not self.db_path:
+            return
+        try:
+            conn = self._connect()
+            try:
+                conn.execute(
+                    "INSERT INTO semantic_cache (created_at, embedding, value, model) VALUES (?, ?, ?, ?)",
+                    (created_at, v.tobytes(), json.dumps(value), self.model)
+                )
+                conn.commit()
+                if evicting:
+                    self._prune_db(conn)
+            finally:
+                conn.close()
+        except Exception as e:
+            print(f"⚠️ Could not persist semantic cache entry: {e}")
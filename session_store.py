@@ -0,0 +1,229 @@
+#session_store.py
+import os
+import json
+import time
+import asyncio
+from collections import deque, OrderedDict
+
+# Seconds an idle session is kept in Redis
+SESSION_TTL = int(os.getenv("SESSION_TTL", "3600"))
+# Maximum number of log lines kept per session
+SESSION_LOG_MAX = int(os.getenv("SESSION_LOG_MAX", "200"))
+# Maximum number of questions / answers kept per session (older ones are dropped)
+SESSION_HISTORY_MAX = int(os.getenv("SESSION_HISTORY_MAX", "50"))
+# Upper bound on sessions held by the in-memory store; least recently used are dropped first
+SESSION_MAX_IN_MEMORY = int(os.getenv("SESSION_MAX_IN_MEMORY", "10000"))
+# Set to e.g. redis://localhost:6379/0 to share sessions between uvicorn workers
+REDIS_URL = os.getenv("REDIS_URL")
+
+
+class _MemorySubscription:
+    def __init__(self, store, session_id: str):
+        self._store = store
+        self._session_id = session_id
+        self._event = asyncio.Event()
+
+    async def __aenter__(self):
+        self._store._subscribers.setdefault(self._session_id, set()).add(self._event)
+        return self
+
+    async def __aexit__(self, *exc):
+        subs = self._store._subscribers.get(self._session_id)
+        if subs is not None:
+            subs.discard(self._event)
+            if not subs:
+                self._store._subscribers.pop(self._session_id, None)
+
+    async def wait(self, timeout: float) -> bool:
+        """Wait for the next change notification; False if timeout elapsed first."""
+        try:
+            await asyncio.wait_for(self._event.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            return False
+        self._event.clear()
+        return True
+
+
+class InMemorySessionStore:
+    """Process-local session store; sessions are only visible to the worker that created them.
+
+    Like the Redis store, idle sessions expire after ttl seconds; at most max_sessions
+    are kept, dropping the least recently used first.
+    """
+
+    def __init__(self, ttl: int = SESSION_TTL, max_sessions: int = SESSION_MAX_IN_MEMORY):
+        self.ttl = ttl
+        self.max_sessions = max(1, max_sessions)
+        self._sessions: OrderedDict = OrderedDict()  # least recently used first
+        self._last_used: dict = {}
+        self._logs: dict = {}
+        self._subscribers: dict = {}
+
+    def _touch(self, session_id: str):
+        self._last_used[session_id] = time.monotonic()
+        self._sessions.move_to_end(session_id)
+
+    def _drop(self, session_id: str):
+        self._sessions.pop(session_id, None)
+        self._last_used.pop(session_id, None)
+        self._logs.pop(session_id, None)
+        # wake any listeners so they notice the session is gone, then forget them
+        for event in self._subscribers.pop(session_id, ()):
+            event.set()
+
+    def _sweep(self):
+        """Drop expired sessions from the LRU end, then any beyond max_sessions."""
+        cutoff = time.monotonic() - self.ttl
+        while self._sessions:
+            oldest = next(iter(self._sessions))
+            if self._last_used[oldest] >= cutoff and len(self._sessions) <= self.max_sessions:
+                break
+            self._drop(oldest)
+
+    async def create(self, session_id: str, session: dict):
+        self._sessions[session_id] = session
+        self._logs[session_id] = deque(maxlen=SESSION_LOG_MAX)
+        self._touch(session_id)
+        self._sweep()
+
+    async def get(self, session_id: str):
+        self._sweep()
+        session = self._sessions.get(session_id)
+        if session is not None:
+            self._touch(session_id)
+        return session
+
+    async def save(self, session_id: str, session: dict):
+        self._sessions[session_id] = session
+        self._touch(session_id)
+        self._sweep()
+
+    async def update(self, session_id: str, fn):
+        """Apply fn to the stored session in place and save it; None if the session is gone.
+
+        There is no await between the read and the write, so concurrent jobs for the
+        same session cannot overwrite each other's changes.
+        """
+        session = await self.get(session_id)
+        if session is None:
+            return None
+        fn(session)
+        await self.save(session_id, session)
+        return session
+
+    async def delete(self, session_id: str):
+        self._drop(session_id)
+
+    async def append_log(self, session_id: str, line: str):
+        if session_id in self._logs:
+            self._logs[session_id].append(line)
+
+    async def get_log(self, session_id: str) -> list:
+        return list(self._logs.get(session_id, []))
+
+    async def notify(self, session_id: str):
+        for event in self._subscribers.get(session_id, ()):
+            event.set()
+
+    def subscribe(self, session_id: str):
+        """Async context manager delivering change notifications for one session."""
+        return _MemorySubscription(self, session_id)
+
+
+class _RedisSubscription:
+    def __init__(self, redis, channel: str):
+        self._pubsub = redis.pubsub()
+        self._channel = channel
+
+    async def __aenter__(self):
+        await self._pubsub.subscribe(self._channel)
+        return self
+
+    async def __aexit__(self, *exc):
+        try:
+            await self._pubsub.unsubscribe(self._channel)
+        finally:
+            await self._pubsub.aclose()
+
+    async def wait(self, timeout: float) -> bool:
+        """Wait for the next change notification; False if timeout elapsed first."""
+        msg = await self._pubsub.get_message(ignore_subscribe_messages=True, timeout=timeout)
+        return msg is not None
+
+
+class RedisSessionStore:
+    """Redis-backed session store with TTL, shared by every worker pointing at the same Redis."""
+
+    def __init__(self, url: str, ttl: int = SESSION_TTL, log_max: int = SESSION_LOG_MAX):
+        import redis.asyncio
+
+        self._redis = redis.asyncio.Redis.from_url(url, decode_responses=True)
+        self.ttl = ttl
+        self.log_max = log_max
+
+    @staticmethod
+    def _key(session_id: str) -> str:
+        return f"session:{session_id}"
+
+    async def create(self, session_id: str, session: dict):
+        await self.save(session_id, session)
+
+    async def get(self, session_id: str):
+        raw = await self._redis.get(self._key(session_id))
+        return json.loads(raw) if raw else None
+
+    async def save(self, session_id: str, session: dict):
+        await self._redis.setex(self._key(session_id), self.ttl, json.dumps(session, default=str))
+
+    async def update(self, session_id: str, fn):
+        """Apply fn to the stored session and save it; None if the session is gone.
+
+        Uses WATCH/MULTI so a write from another job between the read and the write
+        makes this one re-read the session and apply fn again instead of clobbering it.
+        """
+        from redis.exceptions import WatchError
+
+        key = self._key(session_id)
+        async with self._redis.pipeline(transaction=True) as pipe:
+            while True:
+                try:
+                    await pipe.watch(key)
+                    raw = await pipe.get(key)
+                    if not raw:
+                        return None
+                    session = json.loads(raw)
+                    fn(session)
+                    pipe.multi()
+                    pipe.setex(key, self.ttl, json.dumps(session, default=str))
+                    await pipe.execute()
+                    return session
+                except WatchError:
+                    continue
+
+    async def delete(self, session_id: str):
+        await self._redis.delete(self._key(session_id), f"{self._key(session_id)}:log")
+
+    async def append_log(self, session_id: str, line: str):
+        key = f"{self._key(session_id)}:log"
+        async with self._redis.pipeline(transaction=False) as pipe:
+            pipe.rpush(key, line)
+            pipe.ltrim(key, -self.log_max, -1)
+            pipe.expire(key, self.ttl)
+            await pipe.execute()
+
+    async def get_log(self, session_id: str) -> list:
+        return await self._redis.lrange(f"{self._key(session_id)}:log", 0, -1)
+
+    async def notify(self, session_id: str):
+        await self._redis.publish(f"{self._key(session_id)}:events", "changed")
+
+    def subscribe(self, session_id: str):
+        """Async context manager delivering change notifications for one session."""
+        return _RedisSubscription(self._redis, f"{self._key(session_id)}:events")
+
+
+def create_session_store():
+    """Use Redis when REDIS_URL is set, otherwise keep sessions in process memory."""
+    if REDIS_URL:
+        return RedisSessionStore(REDIS_URL)
+    return InMemorySessionStore()
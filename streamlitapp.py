@@ -1,9 +1,61 @@
 #streamlitapp.py
 import streamlit as st
-import requests
+import httpx
+import json
 import time
 
 API_BASE = "http://127.0.0.1:8000"
+# Polling backoff (seconds), only used if the event stream is unavailable
+POLL_INITIAL_DELAY = 0.5
+POLL_MAX_DELAY = 5.0
+POLL_BACKOFF = 1.6
+
+
+@st.cache_resource
+def get_http() -> httpx.Client:
+    """One keep-alive client per Streamlit server, so reruns reuse the connection.
+
+    HTTP/2 is negotiated when API_BASE is served over TLS (e.g. behind a proxy);
+    against plain-http uvicorn the client falls back to HTTP/1.1 keep-alive.
+    """
+    return httpx.Client(base_url=API_BASE, http2=True, timeout=60.0)
+
+
+http = get_http()
+
+
+def wait_for_status(session_id: str, is_done, timeout: float = 300):
+    """Wait until is_done(status) is true and return that status, or None on timeout.
+
+    Subscribes to the backend's /events stream so the UI updates as soon as the LLM
+    finishes; falls back to polling /status if the stream cannot be used.
+    """
+    deadline = time.monotonic() + timeout
+    try:
+        with http.stream("GET", f"/events/{session_id}", timeout=httpx.Timeout(60.0, connect=10.0)) as resp:
+            if resp.status_code == 200:
+                for line in resp.iter_lines():
+                    if time.monotonic() > deadline:
+                        return None
+                    if not line or not line.startswith("data:"):
+                        continue
+                    status_data = json.loads(line[len("data:"):])
+                    if is_done(status_data):
+                        return status_data
+    except (httpx.HTTPError, ValueError):
+        pass
+
+    # poll quickly at first so fast LLM responses show up promptly, then back off
+    delay = POLL_INITIAL_DELAY
+    while time.monotonic() < deadline:
+        status_resp = http.get(f"/status/{session_id}")
+        if status_resp.status_code == 200:
+            status_data = status_resp.json()
+            if is_done(status_data):
+                return status_data
+        time.sleep(delay)
+        delay = min(delay * POLL_BACKOFF, POLL_MAX_DELAY)
+    return None
 
 st.set_page_config(page_title="AI Mock Interview Agent", page_icon="🤖")
 st.title("AI-Powered Mock Interview Agent")
@@ -22,30 +74,24 @@ if st.button("Start Mock Interview"):
     else:
         try:
             with st.spinner("Starting interview (question will be prepared in background)..."):
-                resp = requests.post(f"{API_BASE}/start_interview", json={"job_description": job_description}, timeout=60)
+                resp = http.post("/start_interview", json={"job_description": job_description})
             if resp.status_code == 200:
                 data = resp.json()
                 st.session_state.session_id = data.get("session_id")
                 st.info("Session created. Waiting for question generation...")
 
-                # Poll for first question
-                poll_timeout = 300  # 5 minutes
-                poll_interval = 5
-                elapsed = 0
+                # Wait for first question
                 question = None
                 with st.spinner("Generating first question..."):
-                    while elapsed < poll_timeout:
-                        status_resp = requests.get(f"{API_BASE}/status/{st.session_state.session_id}", timeout=60)
-                        if status_resp.status_code == 200:
-                            status_data = status_resp.json()
-                            if status_data.get('status') == 'ready' and status_data.get('question'):
-                                question = status_data.get('question')
-                                break
-                            if status_data.get('status') == 'error':
-                                st.error(f"Error generating question: {status_data.get('error')}")
-                                break
-                        time.sleep(poll_interval)
-                        elapsed += poll_interval
+                    status_data = wait_for_status(
+                        st.session_state.session_id,
+                        lambda d: d.get('status') == 'error' or (d.get('status') == 'ready' and d.get('question')),
+                        timeout=300
+                    )
+                if status_data and status_data.get('status') == 'error':
+                    st.error(f"Error generating question: {status_data.get('error')}")
+                elif status_data:
+                    question = status_data.get('question')
 
                 if question:
                     st.session_state.current_question = question
@@ -55,9 +101,9 @@ if st.button("Start Mock Interview"):
                     st.error("Timed out waiting for question. Try again later.")
             else:
                 st.error(f"Error starting interview: {resp.status_code} - {resp.text}")
-        except requests.exceptions.Timeout:
+        except httpx.TimeoutException:
             st.error("Request timed out while contacting the backend.")
-        except requests.exceptions.ConnectionError:
+        except httpx.ConnectError:
             st.error("Could not connect to the backend. Is the API server running on http://127.0.0.1:8000 ?")
         except Exception as e:
             st.error(f"Unexpected error: {e}")
@@ -80,35 +126,29 @@ if st.button("Submit Answer"):
         next_q = None
         try:
             with st.spinner("Submitting your answer — evaluation will run in background..."):
-                resp = requests.post(f"{API_BASE}/answer_question/", json=payload, timeout=60)
+                resp = http.post("/answer_question/", json=payload)
             if resp.status_code == 200:
                 st.info("Answer submitted. Full evaluation will appear when ready.")
 
-                # Poll for evaluation result
-                poll_timeout = 300
-                poll_interval = 5
-                elapsed = 0
-                while elapsed < poll_timeout:
-                    status_resp = requests.get(f"{API_BASE}/status/{st.session_state.session_id}", timeout=60)
-                    if status_resp.status_code == 200:
-                        status_data = status_resp.json()
-                        eval_state = status_data.get('evaluation', {})
-                        if eval_state.get('status') == 'ready':
-                            feedback = eval_state.get('last_feedback')
-                            next_q = eval_state.get('next_question')
-                            break
-                        if eval_state.get('status') == 'error':
-                            st.error(f"Evaluation error: {eval_state.get('error')}")
-                            break
-                    time.sleep(poll_interval)
-                    elapsed += poll_interval
+                # Wait for evaluation result
+                status_data = wait_for_status(
+                    st.session_state.session_id,
+                    lambda d: d.get('evaluation', {}).get('status') in ('ready', 'error'),
+                    timeout=300
+                )
+                eval_state = (status_data or {}).get('evaluation', {})
+                if eval_state.get('status') == 'ready':
+                    feedback = eval_state.get('last_feedback')
+                    next_q = eval_state.get('next_question')
+                elif eval_state.get('status') == 'error':
+                    st.error(f"Evaluation error: {eval_state.get('error')}")
                 if feedback is None:
                     st.error("Timed out waiting for evaluation. Try again later.")
             else:
                 st.error(f"Error submitting answer: {resp.status_code} - {resp.text}")
-        except requests.exceptions.Timeout:
+        except httpx.TimeoutException:
             st.error("Request timed out while contacting the backend.")
-        except requests.exceptions.ConnectionError:
+        except httpx.ConnectError:
             st.error("Could not connect to the backend. Is the API server running on http://127.0.0.1:8000 ?")
         except Exception as e:
             st.error(f"Unexpected error: {e}")
@@ -144,3 +184,24 @@ if st.button("Submit Answer"):
                 st.session_state.current_question = next_q
                 st.subheader("Next question:")
                 st.write(next_q)
+
+# ---------------- FINAL SUMMARY ----------------
+if st.button("Finish Interview"):
+    if not st.session_state.session_id:
+        st.warning("No active session. Start an interview first.")
+    else:
+        try:
+            with http.stream("GET", f"/summary/{st.session_state.session_id}", timeout=httpx.Timeout(120.0, connect=10.0)) as resp:
+                if resp.status_code == 200:
+                    st.subheader("Interview summary")
+                    # render tokens as they arrive instead of waiting for the full summary
+                    st.write_stream(resp.iter_text())
+                else:
+                    resp.read()
+                    st.error(f"Error getting summary: {resp.status_code} - {resp.text}")
+        except httpx.TimeoutException:
+            st.error("Request timed out while contacting the backend.")
+        except httpx.ConnectError:
+            st.error("Could not connect to the backend. Is the API server running on http://127.0.0.1:8000 ?")
+        except Exception as e:
+            st.error(f"Unexpected error: {e}")
@@ -47,7 +47,7 @@ if all_required_set:
     # Check if tracing will be enabled
     if os.getenv("LANGSMITH_API_KEY"):
         print("✅ LangSmith tracing will be ENABLED")
-        print("   Your LangChain components (ChatOpenAI, agents, tools) will be traced automatically!")
+        print("   Your OpenAI calls in tools.py will be traced automatically!")
         project = os.getenv("LANGCHAIN_PROJECT", "interview-agent")
         print(f"   Project name: {project}")
         print(f"   View traces at: https://smith.langchain.com/")
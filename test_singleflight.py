@@ -0,0 +1,40 @@
+#test_singleflight.py
+import asyncio
+import unittest
+
+import tools
+
+
+class QuestionSingleflightTest(unittest.TestCase):
+    def test_follower_recovers_when_leader_is_cancelled(self):
+        calls = []
+        original = tools._agenerate_question, tools.llm
+
+        async def fake_generate(job_description, use_cache, previous_questions):
+            calls.append(job_description)
+            if len(calls) == 1:
+                await asyncio.sleep(3600)  # the leader blocks until it is cancelled
+            return {"question": "Q", "key_points": []}
+
+        async def scenario():
+            leader = asyncio.create_task(tools.agenerate_question("jd"))
+            await asyncio.sleep(0)
+            follower = asyncio.create_task(tools.agenerate_question("jd"))
+            await asyncio.sleep(0)
+            leader.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await leader
+            return await asyncio.wait_for(follower, 1)
+
+        tools._agenerate_question, tools.llm = fake_generate, original[1] or object()
+        try:
+            result = asyncio.run(scenario())
+        finally:
+            tools._agenerate_question, tools.llm = original
+        self.assertEqual(result, {"question": "Q", "key_points": []})
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(tools._inflight_questions, {})
+
+
+if __name__ == "__main__":
+    unittest.main()
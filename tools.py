@@ -1,231 +1,1185 @@
 #tools.py
+import config
 import os
+import re
 import json
-import traceback
+import logging
 import time
-from dotenv import load_dotenv
-from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeoutError
-from openai import OpenAI
+import asyncio
+import random
+import hashlib
+import threading
+from collections import OrderedDict
+import openai
+from openai import OpenAI, AsyncOpenAI, DefaultHttpxClient, DefaultAsyncHttpxClient
+import httpx
+import tiktoken
 from langsmith.wrappers import wrap_openai
+from semantic_cache import SemanticCache
 
-# Initialize OpenAI client (loads key from .env automatically)
-load_dotenv()
-
-# ====== Configure LangSmith Tracing ======
-# Enable tracing if API key is set
-if os.getenv("LANGSMITH_API_KEY"):
-    os.environ["LANGCHAIN_TRACING_V2"] = "true"
-    if not os.getenv("LANGCHAIN_PROJECT"):
-        os.environ["LANGCHAIN_PROJECT"] = "interview-agent"
-    if not os.getenv("LANGCHAIN_ENDPOINT"):
-        os.environ["LANGCHAIN_ENDPOINT"] = "https://api.smith.langchain.com"
-    
-    # Wrap OpenAI client to enable automatic tracing
-    _openai_client = OpenAI()
-    client = wrap_openai(_openai_client)
-else:
-    # Use unwrapped client if LangSmith is not configured
-    client = OpenAI()
+logger = logging.getLogger(__name__)
 
-llm = True  # flag to preserve compatibility with your existing logic
+LLM_MODEL = "gpt-4o-mini"
+LLM_TEMPERATURE = 0.7
 
 # Configurable timeout (seconds) for LLM invocations
 LLM_INVOKE_TIMEOUT = int(os.getenv("LLM_INVOKE_TIMEOUT", "120"))
 LLM_INVOKE_RETRIES = int(os.getenv("LLM_INVOKE_RETRIES", "2"))
 LLM_BACKOFF_FACTOR = float(os.getenv("LLM_BACKOFF_FACTOR", "2.0"))
 
+# ====== Precompiled patterns and keyword sets (used on every parse / quick evaluation) ======
+_DECODER = json.JSONDecoder()
+_LIST_TOKEN_RE = re.compile(r"[^\n;,]+")
+_JD_HINT_RE = re.compile(r"\b(years?|experience|require|qualif)")
+_BULLET_RE = re.compile(r"^\s*(?:[-*\u2022]|\d+[.)])\s+", re.MULTILINE)
+
+_STAR_KW = frozenset({"situation", "task", "action", "result", "impact", "resulted", "led to", "we"})
+_TECH_KW = frozenset({
+    "design", "scale", "latency", "throughput", "test", "monitor", "debug", "optimiz",
+    "performance", "deploy", "ci", "cd", "api", "database", "cache", "security", "team", "lead"
+})
+_IMPACT_KW = frozenset({"percent", "%", "x times", "increase", "decrease"})
+_EXAMPLE_KW = frozenset({"example", "we", "i", "led", "implemented", "built"})
+_QUICK_EVAL_KW = _STAR_KW | _TECH_KW | _IMPACT_KW | _EXAMPLE_KW
+
+# One Aho-Corasick automaton finds every quick-eval keyword in a single pass over the
+# answer; without pyahocorasick installed we fall back to one substring scan per keyword.
+try:
+    import ahocorasick
+    _QUICK_EVAL_AC = ahocorasick.Automaton()
+    for _kw in _QUICK_EVAL_KW:
+        _QUICK_EVAL_AC.add_word(_kw, _kw)
+    _QUICK_EVAL_AC.make_automaton()
+except ImportError:
+    _QUICK_EVAL_AC = None
+
+
+def _quick_eval_hits(lowered: str) -> set:
+    """Quick-eval keywords occurring anywhere in lowered (substring semantics)."""
+    if _QUICK_EVAL_AC is not None:
+        return {kw for _, kw in _QUICK_EVAL_AC.iter(lowered)}
+    return {kw for kw in _QUICK_EVAL_KW if kw in lowered}
+
+
+_JD_KW = frozenset({
+    "engineer", "developer", "analyst", "manager", "lead", "senior", "junior", "data",
+    "software", "role", "responsibilities", "requirements", "skills", "position", "hiring",
+    "qualifications", "team", "years of experience", "bachelor", "remote", "salary"
+})
+
+# Pooled, keep-alive HTTP/2 clients shared by every OpenAI call so requests reuse
+# TLS connections (and multiplex over them) instead of handshaking per call;
+# closed by aclose_clients() on app shutdown (see the lifespan in main.py)
+_http_client = DefaultHttpxClient(
+    http2=True,
+    limits=httpx.Limits(max_connections=32, max_keepalive_connections=16, keepalive_expiry=30),
+    timeout=httpx.Timeout(LLM_INVOKE_TIMEOUT, connect=10.0),
+)
+_async_http_client = DefaultAsyncHttpxClient(
+    http2=True,
+    limits=httpx.Limits(max_connections=100, max_keepalive_connections=50, keepalive_expiry=30),
+    timeout=httpx.Timeout(LLM_INVOKE_TIMEOUT, connect=10.0),
+)
+
+# ====== Initialize OpenAI clients (key loaded from .env by config.py) ======
+# Both clients enforce LLM_INVOKE_TIMEOUT on the socket and retry transient
+# failures (connection errors, 408/409/429/5xx) themselves, with backoff.
+# With LangSmith configured both are wrapped so every call is traced.
+_trace = wrap_openai if config.LANGSMITH_ENABLED else (lambda c: c)
+client = _trace(OpenAI(http_client=_http_client, timeout=LLM_INVOKE_TIMEOUT, max_retries=LLM_INVOKE_RETRIES))
+aclient = _trace(AsyncOpenAI(http_client=_async_http_client, timeout=LLM_INVOKE_TIMEOUT, max_retries=LLM_INVOKE_RETRIES))
+
+llm = True  # flag to preserve compatibility with your existing logic
+
+
+async def aclose_clients():
+    """Stop the embedding batcher and close the pooled HTTP / Redis connections."""
+    _embedding_batcher.close()
+    _http_client.close()
+    await _async_http_client.aclose()
+    if _aredis_cache is not None:
+        await _aredis_cache.aclose()
+
+
+# Maximum number of async OpenAI requests in flight per process
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "16"))
+_LLM_SEM = asyncio.Semaphore(LLM_MAX_CONCURRENCY)
+
+# Embedding model used to key the semantic question cache
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "text-embedding-3-small")
+# Micro-batching of async embedding calls: max texts per request, and how long (seconds)
+# to wait for more texts after the first one arrives
+EMBED_BATCH_MAX = int(os.getenv("EMBED_BATCH_MAX", "64"))
+EMBED_BATCH_WINDOW = float(os.getenv("EMBED_BATCH_WINDOW", "0.02"))
+# Created on first use, so importing tools does not create or migrate the cache database
+_question_cache = None
+_question_cache_lock = threading.Lock()
+
+
+def get_question_cache() -> SemanticCache:
+    """Return the semantic question cache, loading it from SEMANTIC_CACHE_DB on first use."""
+    global _question_cache
+    if _question_cache is None:
+        with _question_cache_lock:
+            if _question_cache is None:
+                _question_cache = SemanticCache(model=EMBEDDING_MODEL)
+    return _question_cache
+
+
+async def _aget_question_cache() -> SemanticCache:
+    """Async counterpart of get_question_cache; the first load runs off the event loop."""
+    if _question_cache is not None:
+        return _question_cache
+    return await asyncio.to_thread(get_question_cache)
+
+# Exact-match response cache, keyed by a hash of the model, messages and sampling/output parameters.
+# A process-local LRU sits in front of an optional Redis tier shared by all workers.
+LLM_CACHE_SIZE = int(os.getenv("LLM_CACHE_SIZE", "1024"))
+LLM_CACHE_TTL = int(os.getenv("LLM_CACHE_TTL", str(24 * 3600)))
+LLM_CACHE_REDIS_URL = os.getenv("LLM_CACHE_REDIS_URL", os.getenv("REDIS_URL"))
+_response_cache: OrderedDict = OrderedDict()
+_response_cache_lock = threading.Lock()
+
+if LLM_CACHE_REDIS_URL:
+    import redis
+    import redis.asyncio
+
+    _redis_cache = redis.Redis.from_url(LLM_CACHE_REDIS_URL, decode_responses=True)
+    _aredis_cache = redis.asyncio.Redis.from_url(LLM_CACHE_REDIS_URL, decode_responses=True)
+else:
+    _redis_cache = _aredis_cache = None
+
+
+def _cache_key(model: str, messages: list, temperature: float, **params) -> str:
+    """Hash everything that shapes the response; params left as None are omitted."""
+    payload = {"model": model, "messages": messages, "temperature": temperature}
+    payload.update((k, v) for k, v in params.items() if v is not None)
+    payload = json.dumps(payload, sort_keys=True)
+    return hashlib.blake2b(payload.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def _lru_get(key: str):
+    with _response_cache_lock:
+        value = _response_cache.get(key)
+        if value is not None:
+            _response_cache.move_to_end(key)
+        return value
+
+
+def _lru_put(key: str, value: str):
+    with _response_cache_lock:
+        _response_cache[key] = value
+        _response_cache.move_to_end(key)
+        while len(_response_cache) > LLM_CACHE_SIZE:
+            _response_cache.popitem(last=False)
+
+
+def _cache_get(key: str):
+    """Look a response up in the local LRU, then in Redis (refilling the LRU on a hit)."""
+    value = _lru_get(key)
+    if value is None and _redis_cache is not None:
+        try:
+            value = _redis_cache.get(f"llm:{key}")
+        except Exception as e:
+            print(f"⚠️ Redis LLM cache lookup failed: {e}")
+        if value is not None:
+            _lru_put(key, value)
+    return value
+
+
+def _cache_put(key: str, value: str):
+    if value is None:
+        return
+    _lru_put(key, value)
+    if _redis_cache is not None:
+        try:
+            _redis_cache.setex(f"llm:{key}", LLM_CACHE_TTL, value)
+        except Exception as e:
+            print(f"⚠️ Redis LLM cache write failed: {e}")
+
+
+async def _acache_get(key: str):
+    """Async counterpart of _cache_get."""
+    value = _lru_get(key)
+    if value is None and _aredis_cache is not None:
+        try:
+            value = await _aredis_cache.get(f"llm:{key}")
+        except Exception as e:
+            print(f"⚠️ Redis LLM cache lookup failed: {e}")
+        if value is not None:
+            _lru_put(key, value)
+    return value
+
+
+async def _acache_put(key: str, value: str):
+    """Async counterpart of _cache_put."""
+    if value is None:
+        return
+    _lru_put(key, value)
+    if _aredis_cache is not None:
+        try:
+            await _aredis_cache.setex(f"llm:{key}", LLM_CACHE_TTL, value)
+        except Exception as e:
+            print(f"⚠️ Redis LLM cache write failed: {e}")
+
+
+def _response_cache_key(messages: list, temperature: float, cache: bool, **params):
+    """Cache key for a call, or None when the call must not be cached.
+
+    Sampling at temperature > 0 is only cached when the caller opts in with cache=True.
+    params (response_format, max_tokens, logit_bias, ...) become part of the key.
+    """
+    if not cache and temperature > 0:
+        return None
+    return _cache_key(LLM_MODEL, messages, temperature, **params)
+
+
+def _build_messages(prompt: str, system: str = None, context: str = None) -> list:
+    messages = [_SYSTEM_MESSAGES.get(system) or {"role": "system", "content": system}] if system else []
+    if context:
+        # per-call context goes after the static system prompt so the cached prefix is unchanged
+        messages.append({"role": "system", "content": context})
+    messages.append({"role": "user", "content": prompt})
+    return messages
+
+
+LLM_BACKOFF_MAX = float(os.getenv("LLM_BACKOFF_MAX", "60"))
+
+
+def _backoff_delay(attempt: int) -> float:
+    """Equal-jitter exponential backoff: concurrent sessions retrying together spread out."""
+    return min(LLM_BACKOFF_MAX, (LLM_BACKOFF_FACTOR ** (attempt - 1)) * (0.5 + random.random()))
+
+
+# Process-wide "don't call before" time (time.monotonic()) set from the last 429's
+# retry-after header, so calls already known to be rate limited wait instead of failing
+_rl_state = {"retry_after": 0.0}
+_rl_lock = threading.Lock()
+
+
+def _rate_limit_wait() -> float:
+    """Seconds to hold off before the next request, 0 if we are not rate limited."""
+    with _rl_lock:
+        return max(0.0, _rl_state["retry_after"] - time.monotonic())
+
+
+def _note_rate_limit(e: "openai.RateLimitError"):
+    headers = getattr(getattr(e, "response", None), "headers", None) or {}
+    try:
+        if headers.get("retry-after-ms"):
+            delay = float(headers["retry-after-ms"]) / 1000
+        else:
+            delay = float(headers.get("retry-after") or LLM_BACKOFF_FACTOR)
+    except ValueError:
+        delay = LLM_BACKOFF_FACTOR
+    with _rl_lock:
+        _rl_state["retry_after"] = max(_rl_state["retry_after"], time.monotonic() + delay)
+
+
+class IncompleteJSONError(ValueError):
+    """A JSON-constrained stream ended before its top-level object closed."""
+
+
+class _JsonObjectTracker:
+    """Follows streamed text and reports when the first top-level JSON object closes."""
+
+    def __init__(self):
+        self.depth = 0
+        self.started = False
+        self.in_string = False
+        self.escaped = False
+
+    def feed(self, text: str) -> int:
+        """Index just past the closing brace within text, or -1 if the object is still open."""
+        for i, ch in enumerate(text):
+            if self.in_string:
+                if self.escaped:
+                    self.escaped = False
+                elif ch == '\\':
+                    self.escaped = True
+                elif ch == '"':
+                    self.in_string = False
+            elif ch == '"':
+                self.in_string = self.started
+            elif ch == '{':
+                self.depth += 1
+                self.started = True
+            elif ch == '}' and self.started:
+                self.depth -= 1
+                if self.depth == 0:
+                    return i + 1
+        return -1
+
+
+def _completion_kwargs(messages: list, response_format: dict = None, temperature: float = None,
+                       max_tokens: int = None, logit_bias: dict = None) -> dict:
+    kwargs = {"model": LLM_MODEL, "messages": messages,
+              "temperature": LLM_TEMPERATURE if temperature is None else temperature, **_cache_routing(messages)}
+    if max_tokens:
+        kwargs["max_tokens"] = max_tokens
+    if logit_bias:
+        kwargs["logit_bias"] = logit_bias
+    if response_format:
+        kwargs.update(stream=True, response_format=response_format)
+    return kwargs
+
+
+def _read_json_stream(stream) -> str:
+    """Accumulate a JSON-constrained stream, closing it as soon as the object is complete.
 
-def _invoke_with_timeout(prompt: str, timeout: int = None):
-    """Invoke OpenAI GPT-4o-mini model with timeout and retry/backoff logic."""
+    Raises IncompleteJSONError if the stream ends first (e.g. finish_reason="length"),
+    so a truncated object is never returned or cached.
+    """
+    tracker, parts = _JsonObjectTracker(), []
+    try:
+        for chunk in stream:
+            delta = chunk.choices[0].delta.content if chunk.choices else None
+            if not delta:
+                continue
+            end = tracker.feed(delta)
+            parts.append(delta if end < 0 else delta[:end])
+            if end >= 0:
+                break
+        else:
+            raise IncompleteJSONError("LLM stream ended before the JSON object was complete")
+    finally:
+        stream.close()
+    return "".join(parts)
+
+
+async def _aread_json_stream(stream) -> str:
+    """Async counterpart of _read_json_stream."""
+    tracker, parts = _JsonObjectTracker(), []
+    try:
+        async for chunk in stream:
+            delta = chunk.choices[0].delta.content if chunk.choices else None
+            if not delta:
+                continue
+            end = tracker.feed(delta)
+            parts.append(delta if end < 0 else delta[:end])
+            if end >= 0:
+                break
+        else:
+            raise IncompleteJSONError("LLM stream ended before the JSON object was complete")
+    finally:
+        await stream.close()
+    return "".join(parts)
+
+
+def _invoke_with_timeout(prompt: str, timeout: int = None, cache: bool = False, system: str = None,
+                         response_format: dict = None, context: str = None, temperature: float = None,
+                         max_tokens: int = None, logit_bias: dict = None):
+    """Invoke OpenAI GPT-4o-mini model with timeout and retry/backoff logic.
+
+    The timeout and retries of transient API errors are handled by the OpenAI SDK;
+    the loop here only retries unexpected non-API failures.
+    system, when given, is sent as a leading system message ahead of prompt, followed
+    by context (per-call reference material) if that is given too.
+    response_format (JSON_OBJECT_FORMAT or a json_schema format) constrains the output
+    to a JSON object and streams it, hanging up as soon as the object is complete
+    instead of waiting for any trailing text.
+    temperature (default LLM_TEMPERATURE), max_tokens and logit_bias are passed through
+    to the completion request when given.
+    """
+    timeout = timeout or LLM_INVOKE_TIMEOUT
+    temperature = LLM_TEMPERATURE if temperature is None else temperature
+    messages = _build_messages(prompt, system, context)
+    key = _response_cache_key(messages, temperature, cache, response_format=response_format,
+                              max_tokens=max_tokens, logit_bias=logit_bias)
+    if key:
+        hit = _cache_get(key)
+        if hit is not None:
+            return hit
+
+    attempts = 1 + max(0, LLM_INVOKE_RETRIES)
+    for attempt in range(1, attempts + 1):
+        wait = _rate_limit_wait()
+        if wait > 0:
+            time.sleep(wait)
+        try:
+            # pass timeout per request: with_options() returns a copy without the LangSmith wrapper
+            response = client.chat.completions.create(
+                **_completion_kwargs(messages, response_format, temperature, max_tokens, logit_bias), timeout=timeout
+            )
+            resp = _read_json_stream(response) if response_format else response.choices[0].message.content
+            if key:
+                _cache_put(key, resp)
+            return resp
+        except openai.APITimeoutError:
+            raise RuntimeError(f"LLM call timed out after {timeout} seconds (attempts={attempts})")
+        except openai.RateLimitError as e:
+            _note_rate_limit(e)
+            raise RuntimeError(f"LLM invocation rate limited: {e}")
+        except openai.APIError as e:
+            # already retried by the SDK where retrying makes sense
+            raise RuntimeError(f"LLM invocation failed: {e}")
+        except Exception as e:
+            if attempt < attempts:
+                print(f"⚠️ LLM invocation error (attempt {attempt}/{attempts}): {e}. Retrying...")
+                time.sleep(_backoff_delay(attempt))
+                continue
+            raise RuntimeError(f"LLM invocation failed after {attempt} attempts: {e}")
+
+
+async def _ainvoke_with_timeout(prompt: str, timeout: int = None, cache: bool = False, system: str = None,
+                                response_format: dict = None, context: str = None, temperature: float = None,
+                                max_tokens: int = None, logit_bias: dict = None):
+    """Async counterpart of _invoke_with_timeout backed by AsyncOpenAI.
+
+    timeout is an overall deadline for the call, including waiting on _LLM_SEM
+    and any retries done by the SDK.
+    """
     timeout = timeout or LLM_INVOKE_TIMEOUT
+    temperature = LLM_TEMPERATURE if temperature is None else temperature
+    messages = _build_messages(prompt, system, context)
+    key = _response_cache_key(messages, temperature, cache, response_format=response_format,
+                              max_tokens=max_tokens, logit_bias=logit_bias)
+    if key:
+        hit = await _acache_get(key)
+        if hit is not None:
+            return hit
 
-    def _call():
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0.7
-        )
+    async def _call():
+        async with _LLM_SEM:
+            response = await aclient.chat.completions.create(
+                **_completion_kwargs(messages, response_format, temperature, max_tokens, logit_bias)
+            )
+            if response_format:
+                return await _aread_json_stream(response)
         return response.choices[0].message.content
 
     attempts = 1 + max(0, LLM_INVOKE_RETRIES)
     for attempt in range(1, attempts + 1):
-        with ThreadPoolExecutor(max_workers=1) as ex:
-            fut = ex.submit(_call)
-            try:
-                resp = fut.result(timeout=timeout)
-                return resp
-            except FuturesTimeoutError:
-                fut.cancel()
-                if attempt < attempts:
-                    backoff = (LLM_BACKOFF_FACTOR ** (attempt - 1))
-                    time.sleep(backoff)
-                    continue
-                raise RuntimeError(f"LLM call timed out after {timeout} seconds (attempts={attempts})")
-            except Exception as e:
-                fut.cancel()
-                if attempt < attempts:
-                    print(f"⚠️ LLM invocation error (attempt {attempt}/{attempts}): {e}. Retrying...")
-                    backoff = (LLM_BACKOFF_FACTOR ** (attempt - 1))
-                    time.sleep(backoff)
-                    continue
-                raise RuntimeError(f"LLM invocation failed after {attempt} attempts: {e}")
-
-
-def generate_question(job_description: str) -> str:
-    """Generate the next interview question based on the job description or topic."""
+        wait = _rate_limit_wait()
+        if wait > 0:
+            await asyncio.sleep(wait)
+        try:
+            resp = await asyncio.wait_for(_call(), timeout=timeout)
+            if key:
+                await _acache_put(key, resp)
+            return resp
+        except (asyncio.TimeoutError, openai.APITimeoutError):
+            raise RuntimeError(f"LLM call timed out after {timeout} seconds (attempts={attempts})")
+        except openai.RateLimitError as e:
+            _note_rate_limit(e)
+            raise RuntimeError(f"LLM invocation rate limited: {e}")
+        except openai.APIError as e:
+            # already retried by the SDK where retrying makes sense
+            raise RuntimeError(f"LLM invocation failed: {e}")
+        except Exception as e:
+            if attempt < attempts:
+                print(f"⚠️ LLM invocation error (attempt {attempt}/{attempts}): {e}. Retrying...")
+                await asyncio.sleep(_backoff_delay(attempt))
+                continue
+            raise RuntimeError(f"LLM invocation failed after {attempt} attempts: {e}")
+
+
+async def astream_invoke(prompt: str, system: str = None, timeout: int = None):
+    """Yield the completion for prompt piece by piece as it is generated.
+
+    timeout (default LLM_INVOKE_TIMEOUT) bounds the wait for the response to start and
+    then for each following chunk, so a stalled stream cannot hold _LLM_SEM forever.
+    The upstream response is closed however iteration ends, including when the
+    consumer stops early (e.g. the client disconnected).
+    """
+    timeout = timeout or LLM_INVOKE_TIMEOUT
+    async with _LLM_SEM:
+        try:
+            stream = await asyncio.wait_for(aclient.chat.completions.create(
+                model=LLM_MODEL,
+                messages=_build_messages(prompt, system),
+                temperature=LLM_TEMPERATURE,
+                stream=True
+            ), timeout=timeout)
+        except asyncio.TimeoutError:
+            raise RuntimeError(f"LLM stream did not start within {timeout} seconds")
+        try:
+            while True:
+                try:
+                    chunk = await asyncio.wait_for(stream.__anext__(), timeout=timeout)
+                except StopAsyncIteration:
+                    break
+                except asyncio.TimeoutError:
+                    raise RuntimeError(f"LLM stream stalled for {timeout} seconds")
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+        finally:
+            await stream.close()
+
+
+def _embed(text: str) -> list:
+    """Embed text for the semantic question cache."""
+    response = client.embeddings.create(model=EMBEDDING_MODEL, input=text)
+    return response.data[0].embedding
+
+
+async def _aembed_many(texts: list) -> list:
+    """Embed several texts in a single embeddings request, preserving order."""
+    async with _LLM_SEM:
+        response = await aclient.embeddings.create(model=EMBEDDING_MODEL, input=texts)
+    return [item.embedding for item in sorted(response.data, key=lambda d: d.index)]
+
+
+class _EmbeddingBatcher:
+    """Coalesces concurrent _aembed calls into batched embeddings requests.
+
+    Callers enqueue (text, future) pairs; a background task collects up to
+    EMBED_BATCH_MAX items arriving within EMBED_BATCH_WINDOW seconds of the first
+    one, sends them in a single request and resolves each caller's future.
+    """
+
+    def __init__(self):
+        self._loop = None
+        self._queue = None
+        self._task = None
+        self._collecting = []   # batch _run is still gathering
+        self._flushes = {}      # in-flight flush task -> its batch; holds strong task references
+
+    def _ensure_started(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop or self._task is None or self._task.done():
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._task = loop.create_task(self._run())
+
+    async def embed(self, text: str) -> list:
+        self._ensure_started()
+        fut = self._loop.create_future()
+        self._queue.put_nowait((text, fut))
+        return await fut
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            self._collecting = batch = [await self._queue.get()]
+            deadline = loop.time() + EMBED_BATCH_WINDOW
+            while len(batch) < EMBED_BATCH_MAX:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout=remaining))
+                except asyncio.TimeoutError:
+                    break
+            # flush concurrently so the next batch can start collecting right away
+            self._collecting = []
+            task = loop.create_task(self._flush(batch))
+            self._flushes[task] = batch
+            task.add_done_callback(lambda t: self._flushes.pop(t, None))
+
+    @staticmethod
+    async def _flush(batch: list):
+        try:
+            vectors = await _aembed_many([text for text, _ in batch])
+        except Exception as e:
+            for _, fut in batch:
+                if not fut.done():
+                    fut.set_exception(e)
+            return
+        for (_, fut), vec in zip(batch, vectors):
+            if not fut.done():
+                fut.set_result(vec)
+
+    def close(self):
+        """Stop batching and fail every caller still waiting, instead of leaving them hanging."""
+        if self._task and not self._task.done():
+            self._task.cancel()
+        waiting = [fut for _, fut in self._collecting]
+        for task, batch in list(self._flushes.items()):
+            task.cancel()
+            waiting.extend(fut for _, fut in batch)
+        while self._queue is not None and not self._queue.empty():
+            waiting.append(self._queue.get_nowait()[1])
+        for fut in waiting:
+            if not fut.done():
+                fut.set_exception(RuntimeError("Embedding batcher closed"))
+        self._collecting = []
+        self._flushes.clear()
+
+
+_embedding_batcher = _EmbeddingBatcher()
+
+
+async def _aembed(text: str) -> list:
+    """Async counterpart of _embed; concurrent calls share batched requests."""
+    return await _embedding_batcher.embed(text)
+
+
+# ====== Static system prompts ======
+# These are sent unchanged as the first message of every call so OpenAI's prompt cache
+# can reuse them; keep them byte-identical between calls and put anything dynamic
+# (job description, question, answer) in the user message that follows.
+
+SYSTEM_QUESTION_PROMPT = """You are an expert technical and behavioural interviewer running a realistic mock interview.
+You will receive a job description (or a short topic) and, optionally, the list of questions that have already been asked in this interview.
+
+Your task has three parts.
+
+1. Extract the following fields from the job description:
+   - role: the job title, e.g. "Backend Engineer", "Data Analyst", "Product Manager".
+   - seniority: one of "intern", "junior", "mid", "senior", "lead", "principal", or "unspecified".
+   - skills: a comma-separated string of the most important skills, tools, languages or frameworks mentioned.
+   - job_type: one of "full-time", "part-time", "contract", "internship", or "unspecified".
+   - location: the city/country, "remote", "hybrid", or "unspecified".
+   If a field cannot be inferred, use "unspecified" (or an empty string for skills). Never invent employers or salaries.
+
+2. Produce ONE interview question tailored to that role.
+   Guidelines for the question:
+   - Ask exactly one question. Do not number it and do not add follow-ups or hints.
+   - Keep it concise: one or two sentences, at most 60 words.
+   - Match the seniority. Junior roles get fundamentals and learning-oriented questions; senior and lead roles get
+     questions about architecture, trade-offs, ownership, mentoring and cross-team impact.
+   - Ground it in the listed skills and responsibilities, not in generic trivia.
+   - Alternate between question types across an interview: technical depth, system or solution design,
+     debugging / incident handling, behavioural (STAR-style), and role-specific scenarios.
+   - Never repeat or lightly rephrase a question from the "Previously asked questions" list. Cover a different skill
+     or question type instead.
+   - Prefer open questions that let the candidate show reasoning ("How would you...", "Walk me through...",
+     "Tell me about a time...") over yes/no or pure definition questions.
+   - Avoid questions about protected characteristics, personal life, or salary expectations.
+
+3. List the key points a strong answer to your question would cover: three to five short phrases
+   (under 12 words each), separated by semicolons. They are used later as the reference when grading the answer.
+
+Interview flow:
+   - With no previous questions, open with a question that lets the candidate describe relevant experience with
+     the core skill of the role, so later questions can build on it.
+   - After one or two questions, move to a scenario or design question that exercises judgement, not recall.
+   - Later in the interview, favour behavioural questions about collaboration, conflict, ownership and failure.
+   - If the job description is only a topic (for example "Kubernetes" or "SQL"), treat it as the core skill and
+     infer a sensible role; keep seniority "unspecified" unless it is stated.
+
+Output format:
+Return a single JSON object with exactly these keys and nothing else:
+"role", "seniority", "skills", "job_type", "location", "question", "key_points".
+All values are strings. Do not wrap the JSON in markdown fences and do not add commentary before or after it.
+
+Example 1
+Job Description:
+Senior Python Backend Engineer (remote). You will design and operate FastAPI microservices on AWS, own PostgreSQL
+schemas, and mentor two junior engineers. Experience with Redis, Celery and CI/CD pipelines is required.
+Previously asked questions:
+- Walk me through how you would design a rate limiter for a public FastAPI endpoint.
+Response:
+{"role": "Backend Engineer", "seniority": "senior", "skills": "Python, FastAPI, AWS, PostgreSQL, Redis, Celery, CI/CD", "job_type": "full-time", "location": "remote", "question": "Tell me about a time a PostgreSQL migration you owned caused problems in production. How did you detect it, what did you do, and what did you change afterwards?", "key_points": "Concrete migration and failure mode; How the problem was detected; Immediate mitigation or rollback; Root cause; Lasting process or tooling change"}
+
+Example 2
+Job Description:
+Junior Data Analyst, London, hybrid. Build dashboards in Power BI, write SQL against our warehouse, and present
+weekly KPIs to the marketing team. Excel and basic Python are a plus.
+Response:
+{"role": "Data Analyst", "seniority": "junior", "skills": "SQL, Power BI, Excel, Python", "job_type": "full-time", "location": "London, hybrid", "question": "Marketing says last week's sign-ups dropped by 20% on your dashboard. How would you check whether that is a real drop or a data problem?", "key_points": "Check the data pipeline and source first; Compare against prior periods and seasonality; Segment by channel or platform; Confirm with marketing before reporting"}
+
+Example 3
+Job Description:
+Machine learning engineer
+Response:
+{"role": "Machine Learning Engineer", "seniority": "unspecified", "skills": "", "job_type": "unspecified", "location": "unspecified", "question": "Walk me through how you would take a model from a notebook prototype to a monitored production service.", "key_points": "Reproducible training and packaging; Serving approach and latency needs; Monitoring for drift and data quality; Rollout and rollback strategy"}
+
+Example 4
+Job Description:
+Lead Frontend Developer (contract, Berlin). React, TypeScript, Next.js, design systems, accessibility (WCAG 2.1),
+performance budgets. You will lead a team of four and partner with product design.
+Previously asked questions:
+- How do you structure a shared component library so that several teams can contribute to it safely?
+- Tell me about a time you had to push back on a design that would have hurt accessibility.
+Response:
+{"role": "Frontend Developer", "seniority": "lead", "skills": "React, TypeScript, Next.js, design systems, accessibility, web performance", "job_type": "contract", "location": "Berlin", "question": "A key page's Largest Contentful Paint regressed from 1.8s to 3.5s after a release. How would you lead the team in finding and fixing the cause?", "key_points": "Reproduce and measure with lab and field data; Bisect the release to find the change; Fix and guard with a performance budget in CI; Coordinate the team and communicate impact"}
+"""
+
+SYSTEM_EVAL_PROMPT = """You are an expert interviewer and evaluator giving structured feedback in a mock interview.
+You will receive one interview question and the candidate's answer. Evaluate the answer for relevance, depth,
+clarity and evidence of real experience, then return structured feedback.
+Sometimes the question arrives in a separate context message together with the job description and the key points
+a strong answer covers; then the user message holds only the answer. Use those key points as the reference for
+relevance and depth, but give credit for other correct points the candidate makes.
+
+Scoring rubric for "rating" (integer from 0 to 10):
+- 0: No answer, or the answer is empty, abusive, or completely unrelated to the question.
+- 1-2: Barely addresses the question; mostly off-topic, or one vague sentence with no substance.
+- 3-4: Addresses the question superficially. Key concepts are missing or partly wrong; no concrete example.
+- 5-6: A reasonable, mostly correct answer with some structure, but limited depth, few specifics,
+  or no discussion of trade-offs or outcomes.
+- 7-8: A strong answer. Correct and well structured, with a concrete example or clear reasoning about
+  trade-offs, and some measurable impact or a lesson learned.
+- 9-10: An exceptional answer. Precise, well structured (for behavioural questions: situation, task, action, result),
+  discusses alternatives and trade-offs, quantifies impact, and would clearly impress a senior interviewer.
+Judge the answer against the seniority the question implies. Do not reward length on its own; a short precise answer can
+outrank a long unfocused one. Do not penalise minor grammar or spelling issues.
+
+Feedback guidelines:
+- strengths: what the candidate did well, each item a short, specific phrase (under 15 words).
+- weaknesses: what was missing, incorrect or unclear, each item a short, specific phrase (under 15 words).
+- suggestions: concrete, actionable improvements the candidate can apply next time, each starting with a verb.
+- Give between 0 and 4 items per list. Use an empty list rather than inventing filler.
+- Refer to the content of the answer. Never comment on the candidate's identity or background.
+
+Calibration notes:
+- A correct textbook definition with no application is usually a 4 or 5.
+- An answer that is confident but technically wrong should be rated lower than a hesitant but correct one.
+- For behavioural questions, missing the "result" part of STAR typically costs one or two points.
+- For design questions, reward explicit assumptions, clarifying questions and discussion of failure modes.
+- If the answer addresses a different question than the one asked, rate it at most 3 and say so in weaknesses.
+
+Output format:
+Return ONLY valid JSON with exactly these keys:
+"rating" (integer 0-10), "strengths" (list of strings), "weaknesses" (list of strings), "suggestions" (list of strings).
+Do not wrap the JSON in markdown fences and do not include any other text.
+When the user message holds several numbered question/answer pairs instead of one, return a single JSON object
+{"evaluations": [...]} whose list holds one object with exactly those keys per pair, in the same order.
+
+Example 1
+Question: Tell me about a time a production deployment you owned went wrong. What did you do?
+Candidate Answer: Last year I shipped a schema change that locked our orders table for six minutes during peak traffic.
+I rolled back using our migration tool, then split the change into an additive column plus a backfill job running in
+batches off-peak. I also added a pre-deploy check that flags locking migrations. We have had no lock-related incidents since.
+Response:
+{"rating": 9, "strengths": ["Clear STAR structure", "Concrete technical root cause", "Describes a lasting preventive fix"], "weaknesses": ["Customer impact not quantified"], "suggestions": ["Quantify impact, e.g. failed orders or revenue during the incident"]}
+
+Example 2
+Question: How would you design a cache for an API returning product prices?
+Candidate Answer: I would use Redis because it is fast.
+Response:
+{"rating": 3, "strengths": ["Picks a reasonable technology"], "weaknesses": ["No discussion of invalidation or TTLs", "Ignores price staleness risks", "No sizing or failure handling"], "suggestions": ["Explain when and how cached prices are invalidated", "Discuss what happens when the cache is unavailable", "Mention cache-aside versus write-through trade-offs"]}
+
+Example 3
+Question: Walk me through how you would check whether a 20% drop in weekly sign-ups is real.
+Candidate Answer: First I would compare the dashboard number with the raw events table to rule out a broken pipeline or
+filter. Then I would check whether tracking changed in the last release, and split the drop by channel and device to see where it comes from.
+Response:
+{"rating": 7, "strengths": ["Starts by validating the data source", "Checks recent tracking changes", "Segments the drop to localise it"], "weaknesses": ["Does not mention seasonality or comparing with prior periods"], "suggestions": ["Compare against the same week last year or a rolling average", "Say how you would communicate findings to stakeholders"]}
+
+Example 4
+Question: Explain the difference between a process and a thread.
+Candidate Answer:
+Response:
+{"rating": 0, "strengths": [], "weaknesses": ["No answer provided"], "suggestions": ["Give at least a short definition of each, then one practical consequence of the difference"]}
+"""
+
+# Structured-output formats: question generation only needs a JSON object, evaluation
+# is held to EVAL_SCHEMA so the feedback always parses with json.loads
+JSON_OBJECT_FORMAT = {"type": "json_object"}
+EVAL_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "rating": {"type": "integer", "minimum": 0, "maximum": 10},
+        "strengths": {"type": "array", "items": {"type": "string"}},
+        "weaknesses": {"type": "array", "items": {"type": "string"}},
+        "suggestions": {"type": "array", "items": {"type": "string"}},
+    },
+    "required": ["rating", "strengths", "weaknesses", "suggestions"],
+    "additionalProperties": False,
+}
+EVAL_RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {"name": "feedback", "strict": True, "schema": EVAL_SCHEMA},
+}
+# Multi-answer evaluation: strict schemas need an object at the top level, so the list is wrapped
+EVAL_BATCH_RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {
+        "name": "feedback_batch",
+        "strict": True,
+        "schema": {
+            "type": "object",
+            "properties": {"evaluations": {"type": "array", "items": EVAL_SCHEMA}},
+            "required": ["evaluations"],
+            "additionalProperties": False,
+        },
+    },
+}
+
+# OpenAI only caches prompt prefixes of at least this many tokens
+PROMPT_CACHE_MIN_TOKENS = 1024
+
+# tiktoken downloads its vocabulary on first use (with no timeout), so the encoding is
+# loaded by load_encoding() off the import / startup path -- see the lifespan in main.py --
+# or on the relevance check's first LLM call when that comes first. Only one attempt is made;
+# if it fails the relevance check runs without logit_bias.
+_ENCODING = None
+_encoding_attempted = False
+_encoding_lock = threading.Lock()
+_YES_NO_LOGIT_BIAS = {}
+
+
+def load_encoding():
+    """Load the tiktoken encoding once, then check the prompt heads and tokenise the yes/no answers."""
+    global _ENCODING, _encoding_attempted
+    with _encoding_lock:
+        if _encoding_attempted:
+            return _ENCODING
+        _encoding_attempted = True
+        try:
+            encoding = tiktoken.encoding_for_model(LLM_MODEL)
+        except Exception as e:
+            print(f"⚠️ tiktoken unavailable, prompt token counts disabled: {e}")
+            return None
+
+        for name, head in (("question", SYSTEM_QUESTION_PROMPT), ("evaluation", SYSTEM_EVAL_PROMPT)):
+            n_tokens = len(encoding.encode(head))
+            if n_tokens < PROMPT_CACHE_MIN_TOKENS:
+                print(f"⚠️ {name} system prompt is {n_tokens} tokens, "
+                      f"below the {PROMPT_CACHE_MIN_TOKENS}-token prompt caching threshold")
+        # single-token answers the relevance classifier is restricted to
+        bias = {}
+        for word in ("yes", "no", "Yes", "No"):
+            ids = encoding.encode(word)
+            if len(ids) == 1:
+                bias[str(ids[0])] = 100
+        # filled in one step, so readers never see a half-built yes/no bias
+        _YES_NO_LOGIT_BIAS.update(bias)
+        _ENCODING = encoding
+        return encoding
+
+# The system messages themselves are built once and reused by every call
+_SYSTEM_MESSAGES = {
+    SYSTEM_QUESTION_PROMPT: {"role": "system", "content": SYSTEM_QUESTION_PROMPT},
+    SYSTEM_EVAL_PROMPT: {"role": "system", "content": SYSTEM_EVAL_PROMPT},
+}
+
+# prompt_cache_key routes requests sharing a system prompt to the same cache shard,
+# which raises the prefix-cache hit rate across candidates
+_PROMPT_CACHE_KEYS = {
+    SYSTEM_QUESTION_PROMPT: "mock-interview-question",
+    SYSTEM_EVAL_PROMPT: "mock-interview-evaluation",
+}
+
+
+def _cache_routing(messages: list) -> dict:
+    """Extra request body fields for OpenAI prompt-cache routing, if the call has a known system prompt."""
+    key = _PROMPT_CACHE_KEYS.get(messages[0]["content"]) if messages[0]["role"] == "system" else None
+    return {"extra_body": {"prompt_cache_key": key}} if key else {}
+
+
+# ====== User message templates (the instructions live in the system prompts above) ======
+_Q_TEMPLATE = "Job Description:\n{jd}\n"
+_Q_PREVIOUS_TEMPLATE = "Previously asked questions:\n{questions}\n"
+_EVAL_TEMPLATE = "Question: {q}\nCandidate Answer: {a}"
+_EVAL_BATCH_TEMPLATE = (
+    "Evaluate each of the {n} numbered question/answer pairs below independently and return "
+    "{{\"evaluations\": [...]}} with exactly {n} entries, in input order.\n\n{items}"
+)
+_EVAL_BATCH_ITEM_TEMPLATE = "{i}) Question: {q}\nCandidate Answer: {a}\n"
+_EVAL_CONTEXT_TEMPLATE = "Job Description:\n{jd}\n\nQuestion: {q}\nKey points a strong answer covers:\n{points}"
+_ANSWER_TEMPLATE = "Candidate Answer: {a}"
+_SUMMARY_TEMPLATE = (
+    "Based on this interview:\n{history}\n"
+    "Provide an overall evaluation, highlighting strengths and areas of improvement."
+)
+_SUMMARY_ITEM_TEMPLATE = "Q: {question}\nA: {answer}\nFeedback: {feedback}"
+_RELEVANCE_TEMPLATE = (
+    "Is the following text a job description for a role (answer yes or no)?\n\n{text}\n\n"
+    "Answer only 'yes' or 'no'."
+)
+
+
+def _question_prompt(job_description: str, previous_questions: list = None) -> str:
+    previous = [q for q in (previous_questions or []) if q]
+    prompt = _Q_TEMPLATE.format(jd=job_description)
+    if previous:
+        prompt += _Q_PREVIOUS_TEMPLATE.format(questions="\n".join("- " + q for q in previous))
+    return prompt
+
+
+def _parse_question_response(resp, job_description: str) -> dict:
+    """Turn the raw question-generation output into {"question", "parsed", "key_points"}."""
+    text = getattr(resp, 'content', resp)
+    text = (text or '').strip()
+
+    parsed = _extract_json(text)
+    if not parsed or not isinstance(parsed, dict):
+        parsed = {
+            "role": job_description.split('\n')[0][:60],
+            "seniority": "unspecified",
+            "skills": "",
+            "job_type": "unspecified",
+            "location": "unspecified",
+            "question": f"Based on the job description, can you tell me about your experience related to {job_description.split()[0]}?"
+        }
+
+    question = parsed.get('question') if isinstance(parsed.get('question'), str) else str(parsed.get('question', '')).strip()
+    key_points = parsed.get('key_points') or []
+    if isinstance(key_points, str):
+        key_points = [p.strip() for p in key_points.split(';') if p.strip()]
+    return {"question": question, "parsed": parsed, "key_points": key_points}
+
+
+def generate_question(job_description: str, use_cache: bool = False, previous_questions: list = None) -> str:
+    """Generate the next interview question based on the job description or topic.
+
+    previous_questions are listed in the prompt so the model does not repeat them.
+    With use_cache=True a question cached for a semantically similar job description
+    is returned instead of calling the LLM; only use it for the opening question,
+    since follow-ups for the same job description must differ.
+    """
     if not llm:
         raise RuntimeError("LLM not initialized. Ensure OpenAI API key is set.")
 
-    try:
-        prompt = (
-            f"You are an expert interviewer.\nGiven the following job description, extract the fields: "
-            f"role, seniority, skills, job_type, location, and then produce ONE concise, relevant interview question "
-            f"tailored to the role.\nReturn a JSON object with keys: "
-            f"\"role\", \"seniority\", \"skills\", \"job_type\", \"location\", \"question\" and nothing else.\n\n"
-            f"Job Description:\n{job_description}\n\nRespond with JSON only."
-        )
-        resp = _invoke_with_timeout(prompt)
-        text = getattr(resp, 'content', resp)
-        text = (text or '').strip()
-
-        from re import search
-        parsed = None
+    vec = None
+    if use_cache:
         try:
-            parsed = json.loads(text)
-        except Exception:
-            m = search(r"\{[\s\S]*\}", text)
-            if m:
-                try:
-                    parsed = json.loads(m.group(0))
-                except Exception:
-                    parsed = None
-
-        if not parsed:
-            parsed = {
-                "role": job_description.split('\n')[0][:60],
-                "seniority": "unspecified",
-                "skills": "",
-                "job_type": "unspecified",
-                "location": "unspecified",
-                "question": f"Based on the job description, can you tell me about your experience related to {job_description.split()[0]}?"
-            }
-
-        question = parsed.get('question') if isinstance(parsed.get('question'), str) else str(parsed.get('question', '')).strip()
-        return {"question": question, "parsed": parsed}
+            vec = _embed(job_description)
+            hit = get_question_cache().lookup(vec)
+            if hit:
+                return dict(hit)
+        except Exception as e:
+            print(f"⚠️ Semantic cache lookup failed: {e}")
 
+    try:
+        resp = _invoke_with_timeout(_question_prompt(job_description, previous_questions), cache=True, system=SYSTEM_QUESTION_PROMPT, response_format=JSON_OBJECT_FORMAT)
+        result = _parse_question_response(resp, job_description)
     except Exception as e:
-        print("⚠️ Error in generate_question:", traceback.format_exc())
+        logger.exception("generate_question failed")
         raise RuntimeError(f"Failed to generate question: {e}")
 
+    if vec is not None:
+        # a cache write failure must not turn a generated question into an error
+        try:
+            get_question_cache().add(vec, result)
+        except Exception as e:
+            print(f"⚠️ Semantic cache add failed: {e}")
+    return result
+
+
+# In-flight agenerate_question calls, so identical concurrent requests share one LLM call
+_inflight_questions: dict = {}
 
-def evaluate_answer(question: str, answer: str) -> str:
-    """Evaluate candidate's answer for relevance, depth, and clarity."""
+
+async def agenerate_question(job_description: str, use_cache: bool = False, previous_questions: list = None) -> dict:
+    """Async counterpart of generate_question.
+
+    Concurrent calls with the same arguments await the first caller's result
+    instead of issuing duplicate LLM requests.
+    """
     if not llm:
-        raise RuntimeError("LLM not initialized properly. Please check if OpenAI key is valid.")
+        raise RuntimeError("LLM not initialized. Ensure OpenAI API key is set.")
 
-    def _extract_json(text: str):
+    key = hashlib.blake2b(
+        json.dumps([job_description, previous_questions or [], use_cache]).encode("utf-8"), digest_size=16
+    ).hexdigest()
+    fut = _inflight_questions.get(key)
+    if fut is not None:
         try:
-            parsed = json.loads(text)
-            if isinstance(parsed, str):
-                try:
-                    return json.loads(parsed)
-                except Exception:
-                    return None
-            return parsed
-        except Exception:
-            pass
+            return dict(await asyncio.shield(fut))
+        except asyncio.CancelledError:
+            if not fut.cancelled():
+                raise  # this caller was cancelled itself
+            # the leader was cancelled, which says nothing about this session: try again
+            return await agenerate_question(job_description, use_cache, previous_questions)
+
+    fut = asyncio.get_running_loop().create_future()
+    _inflight_questions[key] = fut
+    try:
+        result = await _agenerate_question(job_description, use_cache, previous_questions)
+        fut.set_result(result)
+        return dict(result)
+    except Exception as e:
+        fut.set_exception(e)
+        fut.exception()  # mark retrieved so an unawaited failure is not logged twice
+        raise
+    except BaseException:
+        # cancellation (or interpreter exit) of the leader must not propagate to followers
+        fut.cancel()
+        raise
+    finally:
+        _inflight_questions.pop(key, None)
+
 
+async def _agenerate_question(job_description: str, use_cache: bool, previous_questions: list) -> dict:
+    vec = None
+    if use_cache:
         try:
-            if (text.startswith('"') and text.endswith('"')) or (text.startswith("'") and text.endswith("'")):
-                unq = text[1:-1]
-                unq = unq.encode('utf-8').decode('unicode_escape')
-                try:
-                    return json.loads(unq)
-                except Exception:
-                    pass
-        except Exception:
-            pass
-
-        import re
-        m = re.search(r"\{[\s\S]*\}", text)
-        if m:
-            cand = m.group(0)
-            try:
-                return json.loads(cand)
-            except Exception:
-                try:
-                    cand2 = cand.encode('utf-8').decode('unicode_escape')
-                    return json.loads(cand2)
-                except Exception:
-                    pass
-        return None
+            vec = await _aembed(job_description)
+            hit = (await _aget_question_cache()).lookup(vec)
+            if hit:
+                return dict(hit)
+        except Exception as e:
+            print(f"⚠️ Semantic cache lookup failed: {e}")
 
-    def _validate_feedback(d: dict):
-        out = {}
+    try:
+        resp = await _ainvoke_with_timeout(_question_prompt(job_description, previous_questions), cache=True, system=SYSTEM_QUESTION_PROMPT, response_format=JSON_OBJECT_FORMAT)
+        result = _parse_question_response(resp, job_description)
+    except Exception as e:
+        logger.exception("agenerate_question failed")
+        raise RuntimeError(f"Failed to generate question: {e}")
+
+    if vec is not None:
+        # a cache write failure must not turn a generated question into an error
         try:
-            out['rating'] = int(d.get('rating')) if d.get('rating') is not None else None
-        except Exception:
-            out['rating'] = None
-
-        def _ensure_list(v):
-            import re as _re
-            if v is None:
-                return []
-            if isinstance(v, list):
-                return v
-            if isinstance(v, str):
-                parts = [s.strip() for s in _re.split(r"[\n;,]", v) if s.strip()]
-                return parts
-            return [str(v)]
-
-        out['strengths'] = _ensure_list(d.get('strengths'))
-        out['weaknesses'] = _ensure_list(d.get('weaknesses'))
-        out['suggestions'] = _ensure_list(d.get('suggestions'))
-        return out
+            await asyncio.to_thread(get_question_cache().add, vec, result)
+        except Exception as e:
+            print(f"⚠️ Semantic cache add failed: {e}")
+    return result
+
+
+def generate_and_prepare(job_description: str, use_cache: bool = False, previous_questions: list = None):
+    """Generate a question and return it with an evaluator already primed for it.
+
+    The question call also returns the key points a strong answer covers, so the
+    returned evaluate_with_ctx(answer) grades against the job description and those
+    points without a separate call to work out what the question was probing.
+    """
+    qobj = generate_question(job_description, use_cache=use_cache, previous_questions=previous_questions)
+    context = eval_context(job_description, qobj.get('question'), qobj.get('key_points'))
+
+    def evaluate_with_ctx(answer: str, cache: bool = True) -> dict:
+        return evaluate_answer_safe(qobj.get('question'), answer, cache=cache, context=context)
+
+    return qobj, evaluate_with_ctx
+
+
+async def agenerate_and_prepare(job_description: str, use_cache: bool = False, previous_questions: list = None):
+    """Async counterpart of generate_and_prepare; evaluate_with_ctx is a coroutine function."""
+    qobj = await agenerate_question(job_description, use_cache=use_cache, previous_questions=previous_questions)
+    context = eval_context(job_description, qobj.get('question'), qobj.get('key_points'))
+
+    async def evaluate_with_ctx(answer: str, cache: bool = True) -> dict:
+        return await aevaluate_answer_safe(qobj.get('question'), answer, cache=cache, context=context)
+
+    return qobj, evaluate_with_ctx
+
 
+async def awarm_question_cache(job_descriptions: list) -> int:
+    """Pre-fill the semantic question cache for a list of common job descriptions.
+
+    All descriptions are embedded in one request; questions are generated concurrently
+    only for those without a cached match. Returns the number of entries added.
+    """
+    job_descriptions = [jd for jd in job_descriptions if jd and jd.strip()]
+    if not job_descriptions:
+        return 0
+
+    vectors = await _aembed_many(job_descriptions)
+    question_cache = await _aget_question_cache()
+    missing = [(jd, vec) for jd, vec in zip(job_descriptions, vectors) if not question_cache.lookup(vec)]
+
+    async def _generate(jd: str):
+        resp = await _ainvoke_with_timeout(_question_prompt(jd), system=SYSTEM_QUESTION_PROMPT, response_format=JSON_OBJECT_FORMAT)
+        return _parse_question_response(resp, jd)
+
+    results = await asyncio.gather(*[_generate(jd) for jd, _ in missing], return_exceptions=True)
+    added = 0
+    for (jd, vec), result in zip(missing, results):
+        if isinstance(result, BaseException):
+            print(f"⚠️ Could not warm question cache for {jd[:60]!r}: {result}")
+            continue
+        try:
+            await asyncio.to_thread(question_cache.add, vec, result)
+        except Exception as e:
+            print(f"⚠️ Could not warm question cache for {jd[:60]!r}: {e}")
+            continue
+        added += 1
+    return added
+
+
+def _extract_json(text: str):
+    """Parse the first JSON object or array in text, ignoring any prose around it."""
+    for start in sorted(i for i in (text.find('{'), text.find('[')) if i >= 0):
+        try:
+            return _DECODER.raw_decode(text, start)[0]
+        except ValueError:
+            continue
+    return None
+
+
+def _validate_feedback(d: dict):
+    out = {}
     try:
-        eval_prompt = (
-            f"You are an expert interviewer and evaluator.\nQuestion: {question}\nCandidate Answer: {answer}\n\n"
-            "Return ONLY valid JSON with the exact keys: rating (0-10 integer), strengths (list of short strings), "
-            "weaknesses (list of short strings), suggestions (list of short strings). Do not include any other text."
-        )
-        response = _invoke_with_timeout(eval_prompt)
-        text = (getattr(response, 'content', response) or '').strip()
+        out['rating'] = int(d.get('rating')) if d.get('rating') is not None else None
+    except Exception:
+        out['rating'] = None
 
-        parsed = _extract_json(text)
-        if parsed is None:
-            retry_prompt = (
-                f"Please provide the same JSON output, and wrap it between <JSON> and </JSON> tags with no other text.\n"
-                f"Question: {question}\nCandidate Answer: {answer}\n\nReturn only: <JSON>{{...}}</JSON>"
-            )
-            resp2 = _invoke_with_timeout(retry_prompt)
-            text2 = (getattr(resp2, 'content', resp2) or '').strip()
-            import re
-            m = re.search(r"<JSON>([\s\S]*?)</JSON>", text2)
-            if m:
-                parsed = _extract_json(m.group(1))
+    def _ensure_list(v):
+        if v is None:
+            return []
+        if isinstance(v, list):
+            return v
+        if isinstance(v, str):
+            return [p for p in (m.strip() for m in _LIST_TOKEN_RE.findall(v)) if p]
+        return [str(v)]
+
+    out['strengths'] = _ensure_list(d.get('strengths'))
+    out['weaknesses'] = _ensure_list(d.get('weaknesses'))
+    out['suggestions'] = _ensure_list(d.get('suggestions'))
+    return out
+
+
+def _summary_prompt(feedback_list: list) -> str:
+    """Prompt for an overall evaluation of answered questions ({question, answer, feedback} dicts)."""
+    history_text = "\n".join(_SUMMARY_ITEM_TEMPLATE.format_map(item) for item in feedback_list)
+    return _SUMMARY_TEMPLATE.format(history=history_text)
+
+
+def _eval_prompt(question: str, answer: str, context: str = None) -> str:
+    if context:
+        # the question is already part of the context message
+        return _ANSWER_TEMPLATE.format(a=answer)
+    return _EVAL_TEMPLATE.format(q=question, a=answer)
 
-        if parsed is None:
-            print("LLM raw output (failed JSON parse):", repr(text))
-            return {"raw_feedback": text}
 
-        validated = _validate_feedback(parsed)
-        validated['raw'] = parsed
-        return validated
+def eval_context(job_description: str, question: str, key_points: list = None) -> str:
+    """Reference material for grading an answer to question, from generate_question's output."""
+    points = "\n".join("- " + p for p in (key_points or [])) or "- (none listed)"
+    return _EVAL_CONTEXT_TEMPLATE.format(jd=job_description, q=question, points=points)
+
+
+def _load_feedback_json(text: str):
+    """Parse schema-constrained evaluation output; None if the stream was cut short."""
+    try:
+        return json.loads(text)
+    except ValueError:
+        return None
+
+
+def _finalize_feedback(parsed, text: str) -> dict:
+    if parsed is None:
+        print("LLM raw output (failed JSON parse):", repr(text))
+        return {"raw_feedback": text}
+
+    validated = _validate_feedback(parsed)
+    validated['raw'] = parsed
+    return validated
+
+
+def evaluate_answer(question: str, answer: str, cache: bool = True, context: str = None) -> str:
+    """Evaluate candidate's answer for relevance, depth, and clarity.
+
+    An identical (question, answer) pair reuses the previous LLM response unless cache=False.
+    context (see eval_context) gives the grader the job description and expected key points.
+    """
+    if not llm:
+        raise RuntimeError("LLM not initialized properly. Please check if OpenAI key is valid.")
+
+    try:
+        response = _invoke_with_timeout(_eval_prompt(question, answer, context), cache=cache, system=SYSTEM_EVAL_PROMPT,
+                                        response_format=EVAL_RESPONSE_FORMAT, context=context)
+        text = (getattr(response, 'content', response) or '').strip()
+
+        return _finalize_feedback(_load_feedback_json(text), text)
 
     except Exception as e:
-        print("⚠️ Error in evaluate_answer:", traceback.format_exc())
+        logger.exception("evaluate_answer failed")
         raise RuntimeError(f"Failed to evaluate answer: {e}")
 
 
-def evaluate_answer_safe(question: str, answer: str) -> dict:
-    """Safe wrapper around evaluate_answer that always returns a structured dict."""
+async def aevaluate_answer(question: str, answer: str, cache: bool = True, context: str = None) -> dict:
+    """Async counterpart of evaluate_answer."""
+    if not llm:
+        raise RuntimeError("LLM not initialized properly. Please check if OpenAI key is valid.")
+
     try:
-        fb = evaluate_answer(question, answer)
+        response = await _ainvoke_with_timeout(_eval_prompt(question, answer, context), cache=cache, system=SYSTEM_EVAL_PROMPT,
+                                               response_format=EVAL_RESPONSE_FORMAT, context=context)
+        text = (getattr(response, 'content', response) or '').strip()
+
+        return _finalize_feedback(_load_feedback_json(text), text)
+
     except Exception as e:
-        print(f"⚠️ evaluate_answer raised an exception: {e}")
-        fb = None
+        logger.exception("aevaluate_answer failed")
+        raise RuntimeError(f"Failed to evaluate answer: {e}")
 
+
+def _safe_feedback(fb, answer: str) -> dict:
     if not fb or not isinstance(fb, dict):
         return {
             "rating": None,
@@ -243,6 +1197,154 @@ def evaluate_answer_safe(question: str, answer: str) -> dict:
     return fb
 
 
+def evaluate_answer_safe(question: str, answer: str, cache: bool = True, context: str = None) -> dict:
+    """Safe wrapper around evaluate_answer that always returns a structured dict."""
+    try:
+        fb = evaluate_answer(question, answer, cache=cache, context=context)
+    except Exception as e:
+        logger.warning("evaluate_answer raised an exception: %s", e)
+        fb = None
+    return _safe_feedback(fb, answer)
+
+
+async def aevaluate_answer_safe(question: str, answer: str, cache: bool = True, context: str = None) -> dict:
+    """Async counterpart of evaluate_answer_safe."""
+    try:
+        fb = await aevaluate_answer(question, answer, cache=cache, context=context)
+    except Exception as e:
+        logger.warning("aevaluate_answer raised an exception: %s", e)
+        fb = None
+    return _safe_feedback(fb, answer)
+
+
+def _eval_batch_prompt(pairs: list) -> str:
+    items = "\n".join(_EVAL_BATCH_ITEM_TEMPLATE.format(i=i, q=q, a=a) for i, (q, a) in enumerate(pairs, 1))
+    return _EVAL_BATCH_TEMPLATE.format(n=len(pairs), items=items)
+
+
+def _parse_batch_feedback(text: str, pairs: list):
+    """Validated feedback list for a batched evaluation, or None if the response does not line up."""
+    parsed = _extract_json(text)
+    if isinstance(parsed, dict):
+        # a lone feedback object (rating, strengths, ...) means the model graded a single answer
+        parsed = None if 'rating' in parsed else parsed.get('evaluations')
+    if not isinstance(parsed, list) or len(parsed) != len(pairs) or not all(isinstance(i, dict) for i in parsed):
+        return None
+    out = []
+    for item, (_, answer) in zip(parsed, pairs):
+        fb = _validate_feedback(item)
+        fb['raw'] = item
+        out.append(_safe_feedback(fb, answer))
+    return out
+
+
+def evaluate_answers_batch(pairs: list, cache: bool = True, context: str = None) -> list:
+    """Evaluate several (question, answer) pairs with a single LLM call.
+
+    Falls back to one evaluate_answer_safe call per pair if the batched response
+    cannot be matched up with the input. context is only meant for pairs that all
+    answer the question it describes.
+    """
+    pairs = list(pairs)
+    if len(pairs) <= 1:
+        return [evaluate_answer_safe(q, a, cache=cache, context=context) for q, a in pairs]
+    try:
+        resp = _invoke_with_timeout(_eval_batch_prompt(pairs), cache=cache, system=SYSTEM_EVAL_PROMPT,
+                                    response_format=EVAL_BATCH_RESPONSE_FORMAT, context=context)
+        feedbacks = _parse_batch_feedback((getattr(resp, 'content', resp) or '').strip(), pairs)
+        if feedbacks is not None:
+            return feedbacks
+        print(f"⚠️ Batched evaluation of {len(pairs)} answers returned an unexpected shape, evaluating one by one")
+    except Exception as e:
+        print(f"⚠️ Batched evaluation failed, evaluating one by one: {e}")
+    return [evaluate_answer_safe(q, a, cache=cache, context=context) for q, a in pairs]
+
+
+async def aevaluate_answers(pairs: list, cache: bool = True, context: str = None) -> list:
+    """Evaluate (question, answer) pairs concurrently, one request per pair."""
+    return await asyncio.gather(*[aevaluate_answer_safe(q, a, cache=cache, context=context) for q, a in pairs])
+
+
+async def aevaluate_answers_batch(pairs: list, cache: bool = True, context: str = None) -> list:
+    """Async counterpart of evaluate_answers_batch."""
+    pairs = list(pairs)
+    if len(pairs) <= 1:
+        return [await aevaluate_answer_safe(q, a, cache=cache, context=context) for q, a in pairs]
+    try:
+        resp = await _ainvoke_with_timeout(_eval_batch_prompt(pairs), cache=cache, system=SYSTEM_EVAL_PROMPT,
+                                           response_format=EVAL_BATCH_RESPONSE_FORMAT, context=context)
+        feedbacks = _parse_batch_feedback((getattr(resp, 'content', resp) or '').strip(), pairs)
+        if feedbacks is not None:
+            return feedbacks
+        print(f"⚠️ Batched evaluation of {len(pairs)} answers returned an unexpected shape, evaluating one by one")
+    except Exception as e:
+        print(f"⚠️ Batched evaluation failed, evaluating one by one: {e}")
+    return await aevaluate_answers(pairs, cache=cache, context=context)
+
+
+# ====== OFFLINE BATCH API ======
+# Poll interval (seconds) while waiting on an OpenAI Batch API job
+EVAL_BATCH_POLL_INTERVAL = float(os.getenv("EVAL_BATCH_POLL_INTERVAL", "30"))
+
+
+def submit_evaluation_batch(pairs: list) -> str:
+    """Submit (question, answer) pairs to the OpenAI Batch API and return the batch id.
+
+    Batch jobs complete within 24h at a lower price, so this is only meant for
+    non-interactive evaluation such as re-scoring stored interviews.
+    """
+    lines = []
+    for i, (q, a) in enumerate(pairs):
+        messages = _build_messages(_eval_prompt(q, a), SYSTEM_EVAL_PROMPT)
+        lines.append(json.dumps({
+            "custom_id": f"eval-{i}",
+            "method": "POST",
+            "url": "/v1/chat/completions",
+            "body": {"model": LLM_MODEL, "messages": messages, "temperature": LLM_TEMPERATURE,
+                     "response_format": EVAL_RESPONSE_FORMAT, **_cache_routing(messages).get("extra_body", {})},
+        }))
+    batch_file = client.files.create(file=("evaluations.jsonl", "\n".join(lines).encode("utf-8")), purpose="batch")
+    batch = client.batches.create(
+        input_file_id=batch_file.id,
+        endpoint="/v1/chat/completions",
+        completion_window="24h",
+    )
+    return batch.id
+
+
+def collect_evaluation_batch(batch_id: str, pairs: list, poll_interval: float = None, timeout: float = None) -> list:
+    """Wait for a batch from submit_evaluation_batch and return feedback in input order."""
+    poll_interval = poll_interval or EVAL_BATCH_POLL_INTERVAL
+    deadline = time.monotonic() + timeout if timeout else None
+    while True:
+        batch = client.batches.retrieve(batch_id)
+        if batch.status in ("completed", "failed", "expired", "cancelled"):
+            break
+        if deadline and time.monotonic() > deadline:
+            raise RuntimeError(f"Evaluation batch {batch_id} still {batch.status} after {timeout} seconds")
+        time.sleep(poll_interval)
+
+    contents = {}
+    if batch.output_file_id:
+        for line in client.files.content(batch.output_file_id).text.splitlines():
+            if not line.strip():
+                continue
+            row = json.loads(line)
+            try:
+                contents[row["custom_id"]] = row["response"]["body"]["choices"][0]["message"]["content"]
+            except (KeyError, IndexError, TypeError):
+                continue
+    if batch.status != "completed":
+        print(f"⚠️ Evaluation batch {batch_id} ended as {batch.status}")
+
+    feedbacks = []
+    for i, (_, answer) in enumerate(pairs):
+        text = (contents.get(f"eval-{i}") or "").strip()
+        fb = _finalize_feedback(_load_feedback_json(text), text) if text else None
+        feedbacks.append(_safe_feedback(fb, answer))
+    return feedbacks
+
+
 def evaluate_answer_quick(question: str, answer: str) -> dict:
     """Fast heuristic evaluator that returns structured feedback quickly."""
     try:
@@ -256,12 +1358,9 @@ def evaluate_answer_quick(question: str, answer: str) -> dict:
             suggestions.append("Provide a concise answer describing your approach or example.")
             return {"rating": rating, "strengths": strengths, "weaknesses": weaknesses, "suggestions": suggestions, "raw_feedback": None}
 
-        keywords = [
-            "design", "scale", "latency", "throughput", "test", "monitor", "debug", "optimiz",
-            "performance", "deploy", "ci", "cd", "api", "database", "cache", "security", "team", "lead"
-        ]
         lowered = text.lower()
-        hits = [k for k in keywords if k in lowered]
+        found = _quick_eval_hits(lowered)
+        hits = sorted(found & _TECH_KW)
         if hits:
             strengths.extend([f"Mentions: {h}" for h in hits[:5]])
 
@@ -275,15 +1374,14 @@ def evaluate_answer_quick(question: str, answer: str) -> dict:
             weaknesses.append("Answer is short; add an example or more specifics")
             length_score = 3
 
-        star_keywords = ["situation", "task", "action", "result", "impact", "resulted", "led to", "we"]
-        if any(w in lowered for w in star_keywords):
+        if found & _STAR_KW:
             strengths.append("Uses STAR-style structure or gives concrete impact")
 
         rating = min(10, max(1, int((len(hits) * 1.5) + (length_score or 0))))
 
-        if "%" not in text and not any(w in lowered for w in ["percent", "%", "x times", "increase", "decrease"]):
+        if not found & _IMPACT_KW:
             suggestions.append("Include measurable impact (e.g., reduced latency by 30%).")
-        if not any(w in lowered for w in ["example", "we", "i", "led", "implemented", "built"]):
+        if not found & _EXAMPLE_KW:
             suggestions.append("Add a concrete example with steps and outcome.")
 
         return {
@@ -304,24 +1402,44 @@ def evaluate_answer_quick(question: str, answer: str) -> dict:
 
 
 def check_relevant_input(user_input: str) -> bool:
-    """Quick heuristic to determine if the input seems like a job description."""
+    """Quick heuristic to determine if the input seems like a job description.
+
+    Keyword, regex and shape checks settle nearly every input; only ambiguous text
+    falls through to a 1-token yes/no LLM classification.
+    """
     if not user_input or len(user_input.strip()) < 20:
         return False
 
-    keywords = [
-        "engineer", "developer", "analyst", "manager", "lead", "senior", "junior", "data",
-        "software", "role", "responsibilities", "requirements", "skills"
-    ]
-    lowered = user_input.lower()
-    if any(k in lowered for k in keywords):
+    text = user_input.strip()
+    lowered = text.lower()
+    if any(k in lowered for k in _JD_KW):
+        return True
+    if _JD_HINT_RE.search(lowered):
+        return True
+
+    # nothing matched: reject what cannot be a posting or topic before asking the LLM
+    words = text.split()
+    if len(words) < 4:
+        return False
+    # mostly digits / symbols (pasted ids, code, noise) is not a job description
+    if sum(c.isalpha() for c in text) < 0.5 * len(text.replace(" ", "")):
+        return False
+    # long, bulleted text reads like a posting even without any known keyword
+    if len(words) >= 40 and len(_BULLET_RE.findall(text)) >= 3:
         return True
 
     if llm:
+        # the lifespan normally loads it in the background; callers outside the API don't run that
+        load_encoding()
         try:
-            prompt = f"Is the following text a job description for a role (answer yes or no)?\n\n{user_input}\n\nAnswer only 'yes' or 'no'."
-            resp = _invoke_with_timeout(prompt)
-            return (getattr(resp, 'content', resp) or '').strip().lower().startswith('y')
-        except Exception:
+            # cached, and subject to the shared rate-limit hold-off, like every other call
+            hit = _invoke_with_timeout(
+                _RELEVANCE_TEMPLATE.format(text=text), cache=True, temperature=0, max_tokens=1,
+                logit_bias=_YES_NO_LOGIT_BIAS or None
+            )
+            return (hit or '').strip().lower().startswith('y')
+        except Exception as e:
+            logger.warning("check_relevant_input LLM classification failed: %s", e)
             return False
 
     return False